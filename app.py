@@ -4,8 +4,18 @@ from flask_cors import CORS
 import threading
 import json, time
 
-from gpio import update_cords_divisions, run, output_all_one, set_copel
+from hardware import (
+    apply_state,
+    run,
+    output_all_one,
+    reload_keymap,
+    hardware_status,
+    io_stats,
+    rt_report,
+    export_trace_vcd,
+)
 from midi import MidiPlayer
+from rtsched import reserve_rt_cpus
 from handleUSB import usb_monitor, handle_scan, send_last_tree, last_tree
 
 
@@ -61,6 +71,36 @@ def reset_registers():
     output_all_one(False)
 
 
+@socket.on("keymap_reload")
+def keymap_reload():
+    socket.emit("keymap_reloaded", {"success": reload_keymap()})
+
+
+@socket.on("hardware_status")
+def hardware_status_request():
+    socket.emit("hardware_status", hardware_status())
+
+
+@socket.on("rt_status")
+def rt_status():
+    socket.emit("rt_status", rt_report())
+
+
+@socket.on("io_stats")
+def io_stats_request():
+    socket.emit("io_stats", io_stats())
+
+
+@socket.on("trace_export")
+def trace_export():
+    try:
+        samples = export_trace_vcd()
+    except Exception as e:
+        socket.emit("trace_exported", {"success": False, "error": str(e)})
+        return
+    socket.emit("trace_exported", {"success": True, "samples": samples})
+
+
 @socket.on("login")
 def login(data):
     with open("./users.json", "r", encoding="utf-8") as file:
@@ -194,10 +234,7 @@ def start_playing():
     for track in tracks:
         if track["name"] == track_name:
             combination = track["combination"][str(step)]
-            set_copel(100, 100 in combination)
-            set_copel(101, 101 in combination)
-            set_copel(102, 102 in combination)
-            update_cords_divisions(combination)
+            apply_state(combination)
 
             socket.emit(
                 "play",
@@ -233,10 +270,7 @@ def next_step():
             for track in tracks:
                 if track["name"] == track_name:
                     combination = track["combination"][str(step)]
-                    set_copel(100, 100 in combination)
-                    set_copel(101, 101 in combination)
-                    set_copel(102, 102 in combination)
-                    update_cords_divisions(combination)
+                    apply_state(combination)
 
                     socket.emit(
                         "next_step_info",
@@ -270,10 +304,7 @@ def previoust_step(data=None):
                 if track["name"] == data["track_name"]:
                     combination = track["combination"][str(data["step_to_edit"])]
 
-                    set_copel(100, 100 in combination)
-                    set_copel(101, 101 in combination)
-                    set_copel(102, 102 in combination)
-                    update_cords_divisions(combination)
+                    apply_state(combination)
                     socket.emit(
                         "previoust_step_info",
                         {
@@ -297,10 +328,7 @@ def previoust_step(data=None):
         for track in tracks:
             if track["name"] == track_name:
                 combination = track["combination"][str(step)]
-                set_copel(100, 100 in combination)
-                set_copel(101, 101 in combination)
-                set_copel(102, 102 in combination)
-                update_cords_divisions(combination)
+                apply_state(combination)
                 socket.emit(
                     "next_step_info",
                     {
@@ -683,8 +711,12 @@ def handle_request_tree():
 
 
 if __name__ == "__main__":
+    # ORGANY_RT=1: Flask/USB zostają poza rdzeniami pętli skanu i MIDI
+    reserve_rt_cpus()
 
-    hc_thread = threading.Thread(target=run, args=(socket, next_step, previoust_step))
+    hc_thread = threading.Thread(
+        target=run, args=(socket, next_step, previoust_step), name="hc"
+    )
     hc_thread.daemon = True
     hc_thread.start()
 
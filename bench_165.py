@@ -0,0 +1,100 @@
+"""
+Benchmark łańcucha wejść 74HC165 przy 1 kHz.
+Najpierw sama obróbka w Pythonie (debounce + zbocza) dla syntetycznych ramek
+– to działa wszędzie, bez RPi. Potem, jeśli jest pigpiod, prawdziwe skany
+łańcucha: czas odczytu i pętla z terminami co 1 ms (liczba przekroczeń).
+Uruchamiać:  python3 bench_165.py [liczba_układów] [sekundy]
+"""
+
+import random
+import sys
+import time
+
+from debounce import Debouncer
+from scheduler import DeadlineLoop
+
+SCAN_HZ = 1000
+
+
+def synthetic_frames(num_bits, count, presses_per_s=20):
+    """Ramki jak z konsoli: większość stoi, co jakiś czas wciśnięcie z drganiami."""
+    frames = []
+    state = 0
+    chance = presses_per_s / SCAN_HZ
+    bounce = 0
+    for _ in range(count):
+        if bounce:
+            noise = random.getrandbits(num_bits) & random.getrandbits(num_bits)
+            frames.append(state ^ noise)
+            bounce -= 1
+            continue
+        if random.random() < chance:
+            state ^= 1 << random.randrange(num_bits)
+            bounce = 3
+        frames.append(state)
+    return frames
+
+
+def bench_processing(num_bits, count):
+    debouncer = Debouncer(num_bits, [((1 << 8) - 1, 0.02)], 0.005, 1.0 / SCAN_HZ)
+    frames = synthetic_frames(num_bits, count)
+    edges = 0
+    start = time.perf_counter()
+    for frame in frames:
+        rising, falling = debouncer.update(frame)
+        while rising:
+            rising ^= rising & -rising
+            edges += 1
+    elapsed = time.perf_counter() - start
+    per_scan_us = elapsed / count * 1e6
+    print(
+        f"obróbka {num_bits} bitów: {per_scan_us:7.2f} µs/skan "
+        f"({per_scan_us / 10:.1f}% budżetu 1 ms, {edges} zboczy)"
+    )
+    return per_scan_us
+
+
+def bench_hardware(num_chips, seconds):
+    try:
+        import gpio
+    except ImportError:
+        print("brak modułu pigpio – pomijam skany sprzętowe")
+        return
+    if not gpio.ensure_hardware(5):
+        print("pigpiod niedostępny – pomijam skany sprzętowe")
+        return
+
+    count = 500
+    start = time.perf_counter()
+    for _ in range(count):
+        gpio.read_165_frame(num_chips)
+    read_us = (time.perf_counter() - start) / count * 1e6
+    print(f"odczyt {num_chips * 8} bitów ({gpio.SCAN_MODE}): {read_us:8.1f} µs/skan")
+
+    debouncer = Debouncer(num_chips * 8, (), 0.005, 1.0 / SCAN_HZ)
+    debouncer.reset(gpio.read_165_frame(num_chips))
+    loop = DeadlineLoop()
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        loop.begin()
+        debouncer.update(gpio.read_165_frame(num_chips))
+        loop.sleep(1.0 / SCAN_HZ)
+    stats = loop.stats()
+    period = stats["period"]
+    print(
+        f"pętla {SCAN_HZ} Hz przez {seconds} s: skanów={period['count'] + 1} "
+        f"przekroczeń={stats['overruns']} okres avg={period['avg_us']:.0f} µs "
+        f"max={period['max_us']:.0f} µs, skan max={stats['scan']['max_us']:.0f} µs"
+    )
+
+
+def main():
+    num_chips = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    for chips in sorted({4, num_chips}):
+        bench_processing(chips * 8, 20000)
+    bench_hardware(num_chips, seconds)
+
+
+if __name__ == "__main__":
+    main()
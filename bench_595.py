@@ -0,0 +1,98 @@
+"""
+Benchmark wysyłania ramki do łańcucha 74HC595.
+Porównuje zapis bit po bicie (pi.write) z nadawaniem całej ramki jako waveform
+oraz (jeśli łańcuch jest podpięty pod SPI) przez sprzętowe SPI, a także
+bitbang przez zmapowane /dev/gpiomem zamiast socketu pigpiod.
+Uruchamiać na RPi z działającym pigpiod:  python3 bench_595.py [liczba_ramek]
+"""
+
+import random
+import sys
+import time
+
+import gpio
+
+FRAME_BITS = 32
+
+
+def random_frames(count, distinct):
+    pool = [random.getrandbits(FRAME_BITS) for _ in range(distinct)]
+    return [random.choice(pool) for _ in range(count)]
+
+
+def bench(label, send, frames):
+    start = time.perf_counter()
+    for frame in frames:
+        send(frame)
+    elapsed = time.perf_counter() - start
+    per_frame_ms = elapsed / len(frames) * 1000
+    print(f"{label:<32} {per_frame_ms:8.3f} ms/ramka  ({len(frames)} ramek)")
+    return per_frame_ms
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    if not gpio.ensure_hardware(10):
+        print("Sprzęt niegotowy:", gpio.hardware_status()["last_error"])
+        return
+    bitbang = gpio.BitBangTransmitter(gpio.pi)
+    tx = gpio.WaveTransmitter(gpio.pi, gpio.SRCLK, gpio.RCLK)
+
+    def send_wave(frame):
+        tx.send(frame, FRAME_BITS, gpio.SER_1)
+        # liczymy do końca nadawania, żeby porównanie było uczciwe
+        tx.wait_idle()
+
+    bitbang_ms = bench(
+        "bitbang (pi.write na bit)",
+        lambda frame: bitbang.send(frame, FRAME_BITS, gpio.SER_1),
+        random_frames(count, count),
+    )
+    wave_new_ms = bench(
+        "waveform, nowe ramki",
+        send_wave,
+        random_frames(count, count),
+    )
+    tx.clear()
+    wave_cached_ms = bench(
+        "waveform, ramki z cache",
+        send_wave,
+        random_frames(count, 8),
+    )
+    print(f"cache: trafienia={tx.hits} chybienia={tx.misses}")
+    print(f"przyspieszenie (nowe):  x{bitbang_ms / wave_new_ms:.1f}")
+    print(f"przyspieszenie (cache): x{bitbang_ms / wave_cached_ms:.1f}")
+    tx.clear()
+
+    try:
+        spi = gpio.SpiTransmitter(gpio.pi)
+    except Exception as e:
+        print("SPI pominięte:", e)
+    else:
+        spi_ms = bench(
+            "SPI + impuls RCLK",
+            lambda frame: spi.send(frame, FRAME_BITS, gpio.SER_1),
+            random_frames(count, count),
+        )
+        print(f"przyspieszenie (SPI):   x{bitbang_ms / spi_ms:.1f}")
+        spi.close()
+
+    try:
+        mem = gpio.GpioMem(gpio.GPIOMEM_PATH)
+    except OSError as e:
+        print("gpiomem pominięte:", e)
+    else:
+        mem_bitbang = gpio.BitBangTransmitter(mem)
+        mem_ms = bench(
+            "bitbang przez /dev/gpiomem",
+            lambda frame: mem_bitbang.send(frame, FRAME_BITS, gpio.SER_1),
+            random_frames(count, count),
+        )
+        print(f"przyspieszenie (gpiomem): x{bitbang_ms / mem_ms:.1f}")
+        mem.stop()
+
+    gpio.output_all_one(False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import struct
+import time
+
+# Zapis surowych ramek łańcucha 165 do pliku binarnego i odczyt z powrotem.
+# Nagłówek: "O165", wersja (B), liczba bitów (H). Potem rekordy tylko przy
+# zmianie ramki: odstęp od poprzedniego rekordu w µs (I) + ramka little-endian
+# (num_bits/8 bajtów). Pierwszy rekord to stan początkowy z odstępem 0.
+
+MAGIC = b"O165"
+VERSION = 1
+_HEADER = struct.Struct("<4sBH")
+_DELTA = struct.Struct("<I")
+_MAX_DELTA_US = 0xFFFFFFFF
+
+
+class FrameWriter:
+    def __init__(self, path, num_bits):
+        self.path = path
+        self.num_bits = num_bits
+        self.frame_bytes = (num_bits + 7) // 8
+        self.records = 0
+        self._last = None
+        self._last_t = None
+        self._f = open(path, "wb")
+        self._f.write(_HEADER.pack(MAGIC, VERSION, num_bits))
+
+    def record(self, frame, now=None):
+        """Zapisuje ramkę, jeśli różni się od poprzedniej; zwraca True, gdy zapisano."""
+        if frame == self._last:
+            return False
+        now = time.monotonic() if now is None else now
+        delta = 0 if self._last_t is None else int(round((now - self._last_t) * 1e6))
+        # dłuższa cisza niż ~71 min – powtarzamy ostatnią ramkę jako "przystanek"
+        while delta > _MAX_DELTA_US:
+            self._f.write(_DELTA.pack(_MAX_DELTA_US) + self._last.to_bytes(self.frame_bytes, "little"))
+            delta -= _MAX_DELTA_US
+        self._f.write(_DELTA.pack(delta) + frame.to_bytes(self.frame_bytes, "little"))
+        self._last = frame
+        self._last_t = now
+        self.records += 1
+        return True
+
+    def close(self):
+        if not self._f.closed:
+            self._f.close()
+
+
+def read_frames(path):
+    """Zwraca (num_bits, [(czas_s od początku, ramka), ...])."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < _HEADER.size:
+        raise ValueError(f"{path}: za krótki plik")
+    magic, version, num_bits = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path}: to nie jest zapis 165 (v{VERSION})")
+    frame_bytes = (num_bits + 7) // 8
+    size = _DELTA.size + frame_bytes
+    frames = []
+    t_us = 0
+    pos = _HEADER.size
+    while pos + size <= len(data):
+        (delta,) = _DELTA.unpack_from(data, pos)
+        t_us += delta
+        frame = int.from_bytes(data[pos + _DELTA.size : pos + size], "little")
+        frames.append((t_us / 1e6, frame))
+        pos += size
+    return num_bits, frames
@@ -0,0 +1,91 @@
+import json
+
+# Długi łańcuch 74HC595 opisany w pliku konfiguracyjnym, np.:
+# {
+#   "chips": 24,
+#   "sections": {
+#     "divisions": {"offset": 0, "bits": 32},
+#     "manual_1": {"offset": 32, "bits": 56},
+#     ...
+#   }
+# }
+# offset liczony w bitach od pierwszego wyjścia łańcucha (bit 0 = ostatni wysłany).
+
+
+class FrameComposer:
+    """
+    Składa ramkę długiego łańcucha z nazwanych sekcji.
+    Spakowana ramka jest trzymana w bytearray (MSB pierwszy, tak jak idzie na drut),
+    zmiana jednej sekcji przepakowuje tylko bajty, które ta sekcja obejmuje.
+    """
+
+    def __init__(self, chips, sections):
+        self.chips = chips
+        self.nbits = chips * 8
+        self.sections = {}
+        used = 0
+        for name, (offset, bits) in sections.items():
+            if bits <= 0 or offset < 0 or offset + bits > self.nbits:
+                raise ValueError(f"Sekcja {name} poza łańcuchem ({self.nbits} bitów)")
+            mask = ((1 << bits) - 1) << offset
+            if used & mask:
+                raise ValueError(f"Sekcja {name} nachodzi na inną sekcję")
+            used |= mask
+            self.sections[name] = (offset, bits)
+
+        self._buf = bytearray(chips)
+        self._values = {name: 0 for name in self.sections}
+        self._frame = 0
+        self._dirty = False
+        self.repacked_bytes = 0  # statystyka: ile bajtów przepakowano od startu
+
+    def has(self, name):
+        return name in self.sections
+
+    def get_section(self, name):
+        return self._values[name]
+
+    def set_section(self, name, value):
+        """Ustawia sekcję; zwraca True, jeśli ramka się zmieniła."""
+        offset, bits = self.sections[name]
+        value &= (1 << bits) - 1
+        if value == self._values[name]:
+            return False
+        self._values[name] = value
+
+        # bajty (licząc od końca bufora), które obejmuje sekcja
+        lo = offset // 8
+        hi = (offset + bits - 1) // 8
+        start = self.chips - 1 - hi
+        end = self.chips - lo
+        shift = offset - lo * 8
+        mask = ((1 << bits) - 1) << shift
+
+        chunk = int.from_bytes(self._buf[start:end], "big")
+        chunk = (chunk & ~mask) | (value << shift)
+        self._buf[start:end] = chunk.to_bytes(end - start, "big")
+        self.repacked_bytes += end - start
+        self._dirty = True
+        return True
+
+    def frame(self):
+        """Cała ramka jako int (bit i = wyjście i+1)."""
+        if self._dirty:
+            self._frame = int.from_bytes(self._buf, "big")
+            self._dirty = False
+        return self._frame
+
+    def to_bytes(self):
+        return bytes(self._buf)
+
+
+def load_chain(path):
+    with open(path, "r", encoding="utf-8") as file:
+        config = json.load(file)
+    sections = {
+        name: (int(s["offset"]), int(s["bits"]))
+        for name, s in config.get("sections", {}).items()
+    }
+    if "divisions" not in sections:
+        raise ValueError("brak sekcji divisions (rejestry)")
+    return FrameComposer(int(config["chips"]), sections)
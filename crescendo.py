@@ -0,0 +1,41 @@
+import json
+
+# Walec crescendo: pozycja pedału (0..48) -> zestaw rejestrów, np.:
+# {"cumulative": true,
+#  "positions": {"0": [], "3": [8, 16], "6": [7], "9": [15, 24]}}
+# Pozycje pominięte w pliku mają zestaw poprzedniej; przy "cumulative"
+# każda podana pozycja dokłada rejestry do poprzednich, bez niego – zastępuje.
+# Dołączony crescendo.json to tylko przykładowa tablica (nie z prawdziwej konsoli) –
+# wczytywana wyłącznie przez ORGANY_CRESCENDO, patrz gpio.py.
+
+POSITIONS = 49
+
+
+def parse_crescendo(config, num_registers, positions=POSITIONS):
+    """Zwraca listę masek (bit n-1 = rejestr n) dla każdej pozycji – gotowe do OR z ramką."""
+    cumulative = config.get("cumulative", True)
+    steps = {}
+    for key, numbers in config.get("positions", {}).items():
+        pos = int(key)
+        if not 0 <= pos < positions:
+            raise ValueError(f"Pozycja crescendo {pos} poza zakresem 0..{positions - 1}")
+        mask = 0
+        for n in numbers:
+            n = int(n)
+            if not 1 <= n <= num_registers:
+                raise ValueError(f"Rejestr {n} (pozycja {pos}) poza zakresem 1..{num_registers}")
+            mask |= 1 << (n - 1)
+        steps[pos] = mask
+
+    masks = [0] * positions
+    current = 0
+    for pos in range(positions):
+        if pos in steps:
+            current = current | steps[pos] if cumulative else steps[pos]
+        masks[pos] = current
+    return masks
+
+
+def load_crescendo(path, num_registers, positions=POSITIONS):
+    with open(path, "r", encoding="utf-8") as file:
+        return parse_crescendo(json.load(file), num_registers, positions)
@@ -0,0 +1,104 @@
+import math
+
+# Debounce całego łańcucha wejść naraz – stan trzymany w spakowanych intach
+# (bit i = wejście i), więc koszt skanu nie zależy od liczby wejść.
+
+MIN_SAMPLES = 2  # pojedyncza próbka nigdy nie przełącza wejścia (np. 50 Hz w spoczynku)
+
+
+class Debouncer:
+    """
+    Integrator na licznikach pionowych.
+    Dla każdego wejścia liczymy kolejne próbki, w których surowy odczyt różni się
+    od stanu stabilnego (bit k licznika wszystkich wejść w planes[k]). Gdy licznik
+    dojdzie do progu wejścia, stan się przełącza. Próg = czas debounce grupy / okres skanu,
+    ale co najmniej MIN_SAMPLES.
+    """
+
+    def __init__(self, num_inputs, groups=(), default_s=0.005, period_s=0.001):
+        self.num_inputs = num_inputs
+        self.all_mask = (1 << num_inputs) - 1
+        self.default_s = default_s
+        # [(maska, czas_s)]; wejścia spoza grup mają default_s
+        self.groups = [(mask & self.all_mask, t) for mask, t in groups]
+        self.state = 0
+        self.period_s = None
+        self.thresholds = []  # bit k progu wszystkich wejść
+        self.planes = []
+        self.set_period(period_s)
+
+    def _threshold(self, debounce_s, period_s):
+        return max(MIN_SAMPLES, math.ceil(debounce_s / period_s - 1e-9))
+
+    def set_period(self, period_s):
+        """Przelicza progi dla nowego okresu skanu (np. po zmianie tempa)."""
+        if period_s == self.period_s:
+            return
+        self.period_s = period_s
+        per_input = []  # (maska, próg)
+        rest = self.all_mask
+        for mask, t in self.groups:
+            per_input.append((mask, self._threshold(t, period_s)))
+            rest &= ~mask
+        per_input.append((rest, self._threshold(self.default_s, period_s)))
+
+        width = max(n for _, n in per_input).bit_length()
+        self.thresholds = [0] * width
+        for mask, n in per_input:
+            for k in range(width):
+                if (n >> k) & 1:
+                    self.thresholds[k] |= mask
+        self.planes = self._carry_counters(self.planes, per_input, width)
+
+    def _carry_counters(self, old, per_input, width):
+        """
+        Rozpoczęte liczenie przeżywa zmianę tempa (zbocze złapane w spoczynku
+        dolicza się szybkimi skanami), ale licznik nie może przekroczyć nowego
+        progu – najwyżej próg-1, więc przełączy dopiero kolejna różna próbka.
+        """
+        planes = [0] * width
+        pending = 0
+        for plane in old:
+            pending |= plane
+        for mask, n in per_input:
+            bits = pending & mask
+            while bits:
+                low = bits & -bits
+                bits ^= low
+                count = 0
+                for k, plane in enumerate(old):
+                    if plane & low:
+                        count |= 1 << k
+                count = min(count, n - 1)
+                for k in range(width):
+                    if (count >> k) & 1:
+                        planes[k] |= low
+        return planes
+
+    def reset(self, state):
+        self.state = state & self.all_mask
+        self.planes = [0] * len(self.thresholds)
+
+    def update(self, raw):
+        """Jedna próbka; zwraca (zbocza_narastające, zbocza_opadające) jako maski."""
+        diff = (raw ^ self.state) & self.all_mask
+        planes = self.planes
+
+        # licznik += 1 tam, gdzie różnica; zero tam, gdzie odczyt zgodny ze stanem
+        carry = diff
+        for k in range(len(planes)):
+            c = planes[k]
+            planes[k] = (c ^ carry) & diff
+            carry &= c
+
+        # które liczniki doszły do progu
+        done = diff
+        for k in range(len(planes)):
+            done &= ~(planes[k] ^ self.thresholds[k])
+        if not done:
+            return 0, 0
+
+        self.state ^= done
+        for k in range(len(planes)):
+            planes[k] &= ~done
+        return done & self.state, done & ~self.state
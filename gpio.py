@@ -2,6 +2,29 @@ import pigpio
 import serial
 import time
 import os
+import atexit
+import random
+import threading
+from collections import OrderedDict
+
+from capture import FrameWriter
+from chain import load_chain
+from crescendo import load_crescendo
+from debounce import Debouncer
+from keymap import load_keymap
+from scheduler import AdaptiveRate, DeadlineLoop, Throttle
+from gpiochip import GpioChip
+from gpiomem import GpioMem
+from inputqueue import InputQueue
+from notify import NotifyStream
+from rtsched import apply_rt_profile, leave_rt_profile
+from simpins import SimPins
+from tracer import TracedPins, Tracer
+
+try:
+    import spidev
+except ImportError:  # opcjonalne – wystarczy SPI przez pigpio
+    spidev = None
 
 # ======= WYJŚCIA 74HC595 (jak było) =======
 SER_1 = 17
@@ -12,6 +35,16 @@ RCLK = 22
 ENC_CLK = 5
 ENC_DT = 6
 POWER_OFF = 4
+# "callback" – pi.callback na każdy pin (jak było)
+# "notify"   – jeden wątek czyta paczki zmian z potoku powiadomień pigpiod;
+#              poziomy są w raporcie, więc enkoder nie robi żadnych pi.read
+EDGE_MODE = os.getenv("ORGANY_EDGES", "callback")
+ENC_GLITCH_US = int(os.getenv("ORGANY_ENC_GLITCH_US", "1000"))  # filtr drgań pigpiod (0 = wył.)
+CRESCENDO_EMIT_HZ = float(os.getenv("ORGANY_CRESCENDO_HZ", "10"))  # max emitów "crescendo"/s
+CRESCENDO_MAX = 48
+# pozycja -> rejestry; bez ORGANY_CRESCENDO enkoder tylko wysyła pozycję do UI,
+# crescendo.json to przykład – wczytywany, gdy ORGANY_CRESCENDO=./crescendo.json
+CRESCENDO_CONFIG = os.getenv("ORGANY_CRESCENDO", "")
 
 REG_MANUAL = 7
 P_I = 16
@@ -19,53 +52,349 @@ P_II = 20
 I_II = 21
 MIDI = 12
 
-# ======= WEJŚCIA 4x 74HC165 =======
+# ======= WEJŚCIA 74HC165 =======
 PIN_165_PL = 19  # SH/LD (aktywny niski)
 PIN_165_CP = 26  # CLK
 PIN_165_Q7 = 13  # DATA z łańcucha do RPi
-NUM_165 = 4  # liczba układów w łańcuchu
+# liczba układów w łańcuchu (4 = przyciski konsoli; +12 = styki manuałów i pedału)
+NUM_165 = int(os.getenv("ORGANY_165_CHIPS", "4"))
 ACTIVE_LOW_165 = True  # jeśli wejścia zwierają do GND
 
-POLL_INTERVAL_S = 0.01  # 10 ms (100 Hz)
+# tempo skanowania: wolne gdy nikt nie dotyka konsoli, szybkie przez chwilę po zmianie
+SCAN_IDLE_HZ = float(os.getenv("ORGANY_SCAN_IDLE_HZ", "50"))
+SCAN_ACTIVE_HZ = float(os.getenv("ORGANY_SCAN_ACTIVE_HZ", "1000"))
+SCAN_ACTIVE_HOLD_S = float(os.getenv("ORGANY_SCAN_HOLD_S", "3.0"))
+
+# debounce wejść 165: czas, przez który odczyt musi być stały, zanim uznamy zmianę
+DEBOUNCE_165_S = 0.005
+KEYMAP_PATH = os.getenv("ORGANY_KEYMAP", "./keymap.json")  # wejście 165 -> akcja
+KEYMAP_CHECK_S = 1.0  # co ile sprawdzamy, czy plik mapy się zmienił
+INPUT_QUEUE_SIZE = 256  # zbocza czekające na obsługę; nadmiar jest odrzucany
+
+DEBOUNCE_165_GROUPS = [
+    # (numery wejść, czas) – pistony krokowe i TUTTI/clear drgają najdłużej
+    (range(19, 23), 0.02),
+]
+# "script"  – cały odczyt 165 jako skrypt w pigpiod, wynik jednym wywołaniem
+# "bitbang" – odczyt bit po bicie przez "pins" (jak było)
+SCAN_MODE = os.getenv("ORGANY_SCAN_MODE", "script")
+
+# ======= ŁAŃCUCHY LED KLAWIATUR (echo MIDI) =======
+# wspólne SRCLK/RCLK z SER_1, więc przesuwane zawsze razem z rejestrami
+# (piny z sandbox.py 21/26 kolidują z I_II i CP 165 – stąd inne)
+KEYS_ECHO = os.getenv("ORGANY_KEYS_ECHO", "0") == "1"
+SER_MANUAL_1 = 23
+SER_MANUAL_2 = 24
+SER_PEDAL = 25
+REG_PEDAL = 4
+NUM_MANUAL_KEYS = REG_MANUAL * 8  # 56
+NUM_PEDAL_KEYS = REG_PEDAL * 8  # 32
+
+# ======= DŁUGI ŁAŃCUCH 595 (sekcje z pliku) =======
+# sekcje: divisions, manual_1, manual_2, pedal, lamps – wszystkie na SER_1;
+# bez ORGANY_CHAIN zostaje sam 32-bitowy łańcuch rejestrów (i osobne linie klawiatur),
+# chain.json to tylko przykład – wczytywany, gdy ORGANY_CHAIN=./chain.json
+CHAIN_CONFIG = os.getenv("ORGANY_CHAIN", "")
+
+# ======= NADAJNIK 74HC595 =======
+# "bitbang" – pi.write na każdy bit (3 zapisy na bit + 2 na latch)
+# "wave"    – cała ramka (dane, SRCLK, RCLK) jako jeden waveform pigpio
+# "spi"     – sprzętowe SPI: SER na MOSI (GPIO10), SRCLK na SCLK (GPIO11), RCLK jak było
+OUTPUT_MODE = os.getenv("ORGANY_OUTPUT_MODE", "wave")
+WAVE_STEP_US = int(os.getenv("ORGANY_WAVE_STEP_US", "1"))  # czas jednego kroku waveformu (połowa taktu SRCLK)
+WAVE_CACHE_SIZE = 32  # ile gotowych waveformów trzymamy w pigpiod
+WAVE_PULSE_BUDGET = 10000  # łączna liczba impulsów w cache (limit pamięci DMA pigpiod)
+SPI_DRIVER = os.getenv("ORGANY_SPI_DRIVER", "pigpio")  # "pigpio" albo "spidev"
+SPI_CHANNEL = 0  # CE0; sam CE nie jest podłączony do 595
+SPI_BAUD = 4_000_000  # 74HC595 spokojnie znosi kilka MHz przy krótkich przewodach
+SPI_MOSI = 10  # przy OUTPUT_MODE=spi łańcuch SER_1 wisi tu, a nie na SER_1/SRCLK
+SPI_SCLK = 11
+RCLK_PULSE_US = 1
+
+# ======= WERYFIKACJA WYJŚĆ (Q7' ostatniego 595 z powrotem do RPi) =======
+# "off"  – brak
+# "gpio" – Q7' na osobnym GPIO (VERIFY_PIN)
+# "165"  – Q7' na wolnym wejściu 165 (VERIFY_165_BIT), wolne: pełny odczyt 165 na bit
+# "spi"  – Q7' na MISO (GPIO9), odczyt równolegle z zapisem SPI
+VERIFY_MODE = os.getenv("ORGANY_VERIFY", "off")
+VERIFY_PIN = 18
+VERIFY_165_BIT = 31
+# część ramek do sprawdzenia; w trybie 165 odczyt to pełny skan 165 na każdy bit – rzadko
+VERIFY_SAMPLE = float(os.getenv("ORGANY_VERIFY_SAMPLE", "0.02" if VERIFY_MODE == "165" else "1.0"))
+SPI_BAUD_STEPS = (250_000, 500_000, 1_000_000, 2_000_000, 4_000_000, 8_000_000, 16_000_000, 32_000_000)
+WAVE_STEP_STEPS = (8, 4, 2, 1)  # µs, od najwolniejszego – szukanie najkrótszego kroku waveformu
+
+# ======= DOSTĘP DO PINÓW =======
+# "pigpio"  – każdy read/write to runda po sockecie do pigpiod (jak było)
+# "gpiomem" – zapis/odczyt rejestrów przez zmapowane /dev/gpiomem;
+#             pigpiod dalej obsługuje callbacki, waveformy i SPI
+# "gpiochip" – linuksowe /dev/gpiochipN (libgpiod), wszystkie linie jednym żądaniem,
+#             zdarzenia z jądra zamiast callbacków; pigpiod niewymagany
+# "sim"     – piny symulowane w pamięci (replay_165.py, testy bez RPi)
+GPIO_BACKEND = os.getenv("ORGANY_GPIO", "pigpio")
+GPIOMEM_PATH = os.getenv("ORGANY_GPIOMEM", "/dev/gpiomem")
+GPIOCHIP_PATH = os.getenv("ORGANY_GPIOCHIP", "/dev/gpiochip0")
+
+# ======= ŚLEDZENIE PINÓW (opcjonalne) =======
+# bez ORGANY_TRACE nic nie jest owijane, więc nie kosztuje ani jednego if-a
+TRACE = os.getenv("ORGANY_TRACE", "0") == "1"
+TRACE_BUFFER = 65536  # liczba zapamiętanych zboczy (bufor pierścieniowy)
+# plik VCD: zrzut przy wyjściu (gdy ustawione) i domyślny cel dla "trace_export"
+TRACE_VCD = os.getenv("ORGANY_TRACE_VCD", "")
+if TRACE and (OUTPUT_MODE, SCAN_MODE) != ("bitbang", "bitbang"):
+    # waveform/SPI/skrypt taktują piny w pigpiod, z pominięciem "pins" – w VCD
+    # nie byłoby SER_1/SRCLK/RCLK ani PL/CP; przy śledzeniu wszystko idzie bitbangiem
+    print(f"ORGANY_TRACE: {OUTPUT_MODE}/{SCAN_MODE} -> bitbang/bitbang, żeby zbocza łańcuchów trafiły do śladu")
+    OUTPUT_MODE = SCAN_MODE = "bitbang"
+
+# zapis surowych ramek 165 do pliku (capture.py) – do odtworzenia przez replay_165.py
+CAPTURE_165 = os.getenv("ORGANY_CAPTURE_165", "")
+
+def _line_config():
+    """Wszystkie linie, których używamy: pin -> (tryb, pull) – do jednego żądania gpiochip."""
+    lines = {}
+    outputs = [SER_1, SRCLK, RCLK, PIN_165_PL, PIN_165_CP, I_II, P_II, P_I, MIDI]
+    if KEYS_ECHO:
+        outputs += [SER_MANUAL_1, SER_MANUAL_2, SER_PEDAL]
+    for pin in outputs:
+        lines[pin] = (pigpio.OUTPUT, pigpio.PUD_OFF)
+    for pin in (ENC_CLK, ENC_DT, POWER_OFF, PIN_165_Q7):
+        lines[pin] = (pigpio.INPUT, pigpio.PUD_UP)
+    if VERIFY_MODE == "gpio":
+        lines[VERIFY_PIN] = (pigpio.INPUT, pigpio.PUD_DOWN)
+    return lines
+
+
+# Sprzęt łączy się leniwie (ensure_hardware/start_hardware, sekcja SPRZĘT niżej):
+# import modułu nie dotyka pigpiod ani pinów, więc serwer web startuje od razu.
+pi = None
+# "pins" ma interfejs pigpio dla read/write/set_mode/bank – przez niego idą gorące ścieżki
+pins = None
+# callbacki na zboczach: gpiochip ma własne zdarzenia, gpiomem korzysta z pigpiod
+events = None
+
+
+def _open_pins():
+    """Łączy z pigpiod i otwiera backend pinów; zwraca (pi, pins). Rzuca, gdy się nie da."""
+    new_pi = None if GPIO_BACKEND == "sim" else pigpio.pi()
+    if new_pi is not None and not new_pi.connected:
+        if GPIO_BACKEND != "gpiochip":
+            raise ConnectionError("Nie można połączyć z pigpiod.")
+        # bez pigpiod: waveform/SPI przez pigpio niedostępne, zostaje bitbang przez gpiochip
+        print("Brak pigpiod – działam tylko na gpiochip.")
+        new_pi = None
+
+    new_pins = new_pi
+    if GPIO_BACKEND == "sim":
+        new_pins = SimPins()
+        new_pins.attach_165(PIN_165_PL, PIN_165_CP, PIN_165_Q7)
+    elif GPIO_BACKEND == "gpiomem":
+        try:
+            new_pins = GpioMem(GPIOMEM_PATH)
+        except OSError as e:
+            print(f"Brak dostępu do {GPIOMEM_PATH}, zostaje pigpio:", e)
+    elif GPIO_BACKEND == "gpiochip":
+        try:
+            new_pins = GpioChip(GPIOCHIP_PATH, _line_config())
+        except Exception as e:
+            if new_pi is None:
+                raise ConnectionError(f"Nie można otworzyć {GPIOCHIP_PATH}: {e}") from e
+            print(f"Brak dostępu do {GPIOCHIP_PATH}, zostaje pigpio:", e)
+    return new_pi, new_pins
+
+
+tracer = None
+if TRACE:
+    tracer = Tracer(
+        TRACE_BUFFER,
+        {
+            SER_1: "SER_1",
+            SRCLK: "SRCLK",
+            RCLK: "RCLK",
+            PIN_165_PL: "PL_165",
+            PIN_165_CP: "CP_165",
+            PIN_165_Q7: "Q7_165",
+            P_I: "P_I",
+            P_II: "P_II",
+            I_II: "I_II",
+            MIDI: "MIDI",
+        },
+    )
+    if KEYS_ECHO:
+        tracer.names.update(
+            {SER_MANUAL_1: "SER_MANUAL_1", SER_MANUAL_2: "SER_MANUAL_2", SER_PEDAL: "SER_PEDAL"}
+        )
+
+
+def _init_pins():
+    """Tryby i stany spoczynkowe wszystkich pinów – po każdym (ponownym) połączeniu."""
+    # --- init 74HC595 ---
+    for pin in [SER_1, SRCLK, RCLK] + ([SER_MANUAL_1, SER_MANUAL_2, SER_PEDAL] if KEYS_ECHO else []):
+        pins.set_mode(pin, pigpio.OUTPUT)
+        pins.write(pin, 0)
+
+    # --- init enkodera ---
+    pins.set_mode(ENC_CLK, pigpio.INPUT)
+    pins.set_pull_up_down(ENC_CLK, pigpio.PUD_UP)
+    pins.set_mode(ENC_DT, pigpio.INPUT)
+    pins.set_pull_up_down(ENC_DT, pigpio.PUD_UP)
+    pins.set_mode(POWER_OFF, pigpio.INPUT)
+    pins.set_pull_up_down(POWER_OFF, pigpio.PUD_UP)
+
+    # --- init 74HC165 ---
+    pins.set_mode(PIN_165_PL, pigpio.OUTPUT)
+    pins.set_mode(PIN_165_CP, pigpio.OUTPUT)
+    pins.set_mode(I_II, pigpio.OUTPUT)
+    pins.set_mode(P_II, pigpio.OUTPUT)
+    pins.set_mode(P_I, pigpio.OUTPUT)
+    pins.set_mode(MIDI, pigpio.OUTPUT)
+    pins.set_mode(PIN_165_Q7, pigpio.INPUT)
+    # delikatny pull-up na wejściu odczytu, żeby nie "pływało" gdy łańcuch nieaktywny
+    pins.set_pull_up_down(PIN_165_Q7, pigpio.PUD_UP)
+    if VERIFY_MODE == "gpio":
+        pins.set_mode(VERIFY_PIN, pigpio.INPUT)
+        pins.set_pull_up_down(VERIFY_PIN, pigpio.PUD_DOWN)
+
+    # domyślne stany
+    pins.write(PIN_165_PL, 1)  # tryb przesuwania
+    pins.write(PIN_165_CP, 0)
+
+
+NUM_REGISTERS = 32  # wyjścia 595 na łańcuchu SER_1 (rejestry 1..32)
+ALL_REGISTERS = (1 << NUM_REGISTERS) - 1
+TUTTI_MASK = ALL_REGISTERS & ~(1 << (17 - 1))  # TUTTI bez rejestru 17
+
+# kople: numer -> (bit w OrganState.copels, pin)
+COPEL_BITS = {100: 1 << 0, 101: 1 << 1, 102: 1 << 2}
+COPEL_PINS = {100: P_I, 101: P_II, 102: I_II}
+
+
+class OrganState:
+    """
+    Stan organów w postaci masek bitowych.
+    registers: bit (n-1) = rejestr n, wyciągnięte ręcznie (to widzi UI)
+    crescendo: rejestry dołożone przez walec crescendo, OR-owane przy wysyłaniu
+    copels:    bity kopli 100/101/102 (patrz COPEL_BITS)
+    """
+
+    def __init__(self, num_registers=NUM_REGISTERS):
+        self.num_registers = num_registers
+        self.all_mask = (1 << num_registers) - 1
+        self.registers = 0
+        self.crescendo = 0
+        self.copels = 0
+        # LED-y klawiszy: bit i = klawisz i (od najniższego)
+        self.manual_1 = 0
+        self.manual_2 = 0
+        self.pedal = 0
+        # pozostałe sekcje długiego łańcucha (np. "lamps"), patrz set_chain_section
+        self.sections = {}
+
+    def is_on(self, number):
+        return (self.registers >> (number - 1)) & 1
+
+    def toggle_register(self, number):
+        if 1 <= number <= self.num_registers:
+            self.registers ^= 1 << (number - 1)
+
+    def set_registers(self, selected_ids):
+        mask = 0
+        for i in selected_ids:
+            n = int(i)
+            if 1 <= n <= self.num_registers:
+                mask |= 1 << (n - 1)
+        self.registers = mask
+
+    def sounding(self):
+        """Maska rejestrów na wyjściu 595: ręczne + crescendo."""
+        return self.registers | self.crescendo
+
+    def active_registers(self):
+        return [n + 1 for n in range(self.num_registers) if (self.registers >> n) & 1]
+
+    def copel(self, type):
+        return 1 if self.copels & COPEL_BITS[type] else 0
+
+    def toggle_copel(self, type):
+        self.copels ^= COPEL_BITS[type]
+
+    def set_copel(self, type, state):
+        if state:
+            self.copels |= COPEL_BITS[type]
+        else:
+            self.copels &= ~COPEL_BITS[type]
 
-pi = pigpio.pi()
-if not pi.connected:
-    print("Nie można połączyć z pigpiod.")
-    exit(1)
+    def set_key(self, channel, note, on):
+        if channel == 2:
+            idx = note - 24
+            if 0 <= idx < NUM_PEDAL_KEYS:
+                self.pedal = self.pedal | (1 << idx) if on else self.pedal & ~(1 << idx)
+            return
+        idx = note - 36
+        if not 0 <= idx < NUM_MANUAL_KEYS:
+            return
+        if channel == 0:
+            self.manual_1 = self.manual_1 | (1 << idx) if on else self.manual_1 & ~(1 << idx)
+        elif channel == 1:
+            self.manual_2 = self.manual_2 | (1 << idx) if on else self.manual_2 & ~(1 << idx)
 
-# --- init 74HC595 ---
-for pin in [SER_1, SRCLK, RCLK]:
-    pi.set_mode(pin, pigpio.OUTPUT)
-    pi.write(pin, 0)
+    def frame(self):
+        # wołane tylko z wątku output_writer – tylko on zmienia composer łańcucha
+        if chain is not None:
+            # niezmienione sekcje nic nie kosztują – composer porównuje wartości
+            chain.set_section("divisions", self.registers | self.crescendo)
+            if KEYS_ECHO:
+                for name in ("manual_1", "manual_2", "pedal"):
+                    if chain.has(name):
+                        chain.set_section(name, getattr(self, name))
+            for name, value in list(self.sections.items()):
+                chain.set_section(name, value)
+            return chain.frame()
+        if KEYS_ECHO:
+            return (self.registers | self.crescendo, self.manual_1, self.manual_2, self.pedal)
+        return self.registers | self.crescendo
 
-# --- init enkodera ---
-pi.set_mode(ENC_CLK, pigpio.INPUT)
-pi.set_pull_up_down(ENC_CLK, pigpio.PUD_UP)
-pi.set_mode(ENC_DT, pigpio.INPUT)
-pi.set_pull_up_down(ENC_DT, pigpio.PUD_UP)
-pi.set_mode(POWER_OFF, pigpio.INPUT)
-pi.set_pull_up_down(POWER_OFF, pigpio.PUD_UP)
 
-# --- init 74HC165 ---
-pi.set_mode(PIN_165_PL, pigpio.OUTPUT)
-pi.set_mode(PIN_165_CP, pigpio.OUTPUT)
-pi.set_mode(I_II, pigpio.OUTPUT)
-pi.set_mode(P_II, pigpio.OUTPUT)
-pi.set_mode(P_I, pigpio.OUTPUT)
-pi.set_mode(MIDI, pigpio.OUTPUT)
-pi.set_mode(PIN_165_Q7, pigpio.INPUT)
-# delikatny pull-up na wejściu odczytu, żeby nie "pływało" gdy łańcuch nieaktywny
-pi.set_pull_up_down(PIN_165_Q7, pigpio.PUD_UP)
+organ = OrganState()
+
+chain = None
+if CHAIN_CONFIG:
+    try:
+        chain = load_chain(CHAIN_CONFIG)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Błędna konfiguracja łańcucha {CHAIN_CONFIG}:", e)
+if chain is not None and KEYS_ECHO:
+    if not any(chain.has(name) for name in ("manual_1", "manual_2", "pedal")):
+        # klawiatury idą wtedy osobnymi liniami SER_MANUAL_*/SER_PEDAL
+        print(f"{CHAIN_CONFIG}: brak sekcji klawiatur, echo zostaje na osobnych liniach")
+        chain = None
+
+
+# maski crescendo dla pozycji 0..CRESCENDO_MAX, policzone raz przy wczytaniu
+crescendo_table = None
+
+
+def reload_crescendo(path=None):
+    """Wczytuje tablicę crescendo; przy błędzie zostaje poprzednia. Zwraca True, gdy się udało."""
+    global crescendo_table
+    path = path or CRESCENDO_CONFIG
+    if not path:
+        return False
+    try:
+        table = load_crescendo(path, NUM_REGISTERS, CRESCENDO_MAX + 1)
+    except (OSError, ValueError) as e:
+        print(f"Nie wczytano crescendo {path}:", e)
+        return False
+    crescendo_table = table
+    return True
 
-# domyślne stany
-pi.write(PIN_165_PL, 1)  # tryb przesuwania
-pi.write(PIN_165_CP, 0)
 
-cords = {str(i): 0 for i in range(1, 33)}
+if CRESCENDO_CONFIG:
+    reload_crescendo()
 
 
 position = 0
-last_encoded = (pi.read(ENC_CLK) << 1) | pi.read(ENC_DT)
+last_encoded = 0  # ustawiane przy połączeniu ze sprzętem
 
 
 _last_power_off_time = 0
@@ -82,45 +411,38 @@ def power_off_callback(level, socket):
         os.system("sudo shutdown now")
 
 
-copel_states = {
-    100: 0,
-    101: 0,
-    102: 0,
-}
+_keyboard_disabled = None  # ostatnie żądanie (None = nie ustawiano), odtwarzane po połączeniu
 
 
 def disable_keyboard(state):
-    pi.write(MIDI, 0 if state == True else 1)
+    global _keyboard_disabled
+    _keyboard_disabled = state == True
+    # bez sprzętu tylko zapamiętujemy – _restore_outputs ustawi pin po połączeniu
+    if hardware_ready.is_set():
+        pins.write(MIDI, 0 if state == True else 1)
 
 
 def apply_copel(type: int):
-    if type == 100:
-        pi.write(P_I, copel_states[100])
-    elif type == 101:
-        pi.write(P_II, copel_states[101])
-    elif type == 102:
-        pi.write(I_II, copel_states[102])
+    if type in COPEL_PINS and hardware_ready.is_set():
+        pins.write(COPEL_PINS[type], organ.copel(type))
 
 
 def copels(type: int):
-    # toggle – tylko zmiana w słowniku
-    copel_states[type] ^= 1
+    # toggle – tylko zmiana bitu w stanie
+    organ.toggle_copel(type)
     apply_copel(type)
-    print(f"copels({type}) -> {copel_states[type]}")
+    print(f"copels({type}) -> {organ.copel(type)}")
 
 
 def set_copel(type: int, state: bool):
     # ustawienie na sztywno
-    copel_states[type] = 1 if state else 0
+    organ.set_copel(type, state)
     apply_copel(type)
-    print(f"set_copel({type}, {state}) -> {copel_states[type]}")
+    print(f"set_copel({type}, {state}) -> {organ.copel(type)}")
 
 
 def output_all_one(state: bool):
-    for k in cords:
-        cords[k] = 0 if state == False else 1
-        if k == "17":
-            cords[k] = 0
+    organ.registers = TUTTI_MASK if state else 0
     shift_out_from_cords()
     set_copel(100, state)
     set_copel(101, state)
@@ -128,55 +450,875 @@ def output_all_one(state: bool):
 
 
 # ======= 74HC595 =======
+# Ramka to int: bit i = wyjście i+1 (pierwszy element dawnej listy).
+# Wysyłamy od najstarszego bitu, więc bit 0 ląduje na pierwszym wyjściu łańcucha.
+def bits_to_frame(bit_list):
+    frame = 0
+    for i, bit in enumerate(bit_list):
+        if bit:
+            frame |= 1 << i
+    return frame
+
+
+def parallel_steps(chains, nbits):
+    """
+    Dla łańcuchów na wspólnym SRCLK: maska pinów danych w stanie 1 dla każdego taktu.
+    chains to lista (pin, ramka, nbits); krótsze łańcuchy dostają na początku zera,
+    więc ich dane i tak wypełniają je do końca po ostatnim takcie.
+    """
+    masks = [(1 << pin, frame) for pin, frame, _ in chains]
+    steps = []
+    for i in range(nbits - 1, -1, -1):
+        on = 0
+        for mask, frame in masks:
+            if (frame >> i) & 1:
+                on |= mask
+        steps.append(on)
+    return steps
+
+
+def frame_to_bytes(frame, nbits):
+    """Bajty dla SPI (MSB pierwszy); nadmiarowe zera z przodu i tak wypadają z łańcucha."""
+    return frame.to_bytes((nbits + 7) // 8, "big")
+
+
+class BitBangTransmitter:
+    """
+    Wysyłanie bit po bicie (działa zawsze). Przez pigpiod najwolniejsze,
+    z GpioMem zamiast "pi" każdy zapis to jedno przypisanie do rejestru.
+    """
+
+    def __init__(self, pi, srclk=SRCLK, rclk=RCLK, data_pins=None):
+        self.pi = pi
+        self.srclk = srclk
+        self.rclk = rclk
+        # linia danych -> pin, na którym łańcuch naprawdę jest (okablowanie SPI: SER_1 -> MOSI)
+        self.data_pins = dict(data_pins or {})
+
+    def data_pin(self, pinout):
+        return self.data_pins.get(pinout, pinout)
+
+    def send(self, frame, nbits, pinout):
+        pinout = self.data_pin(pinout)
+        for i in range(nbits - 1, -1, -1):
+            self.pi.write(pinout, (frame >> i) & 1)
+            self.pi.write(self.srclk, 1)
+            self.pi.write(self.srclk, 0)
+        self.pi.write(self.rclk, 1)
+        self.pi.write(self.rclk, 0)
+
+    def send_parallel(self, chains):
+        """Wszystkie linie danych na takt ustawiane operacjami bankowymi (2-3 zamiast 2+N)."""
+        chains = [(self.data_pin(pin), frame, n) for pin, frame, n in chains]
+        nbits = max(n for _, _, n in chains)
+        data_mask = 0
+        for pin, _, _ in chains:
+            data_mask |= 1 << pin
+        clk = 1 << self.srclk
+        for on in parallel_steps(chains, nbits):
+            # zbocze opadające SRCLK razem z zerami na danych, potem jedynki, potem takt
+            self.pi.clear_bank_1((data_mask & ~on) | clk)
+            if on:
+                self.pi.set_bank_1(on)
+            self.pi.set_bank_1(clk)
+        self.pi.set_bank_1(1 << self.rclk)
+        self.pi.clear_bank_1((1 << self.rclk) | clk)
+
+
+class SpiTransmitter:
+    """
+    Wysyła ramkę przez sprzętowe SPI i raz impulsuje RCLK.
+    Łańcuch 595 to zwykły rejestr przesuwny SPI (tryb 0, MSB pierwszy),
+    więc 32 bity to kilka mikrosekund na magistrali i dwa wywołania.
+    Argument pinout jest ignorowany – dane zawsze idą na MOSI.
+    """
+
+    def __init__(self, pi, rclk=RCLK, channel=SPI_CHANNEL, baud=SPI_BAUD, driver=SPI_DRIVER):
+        self.pi = pi
+        self.rclk = rclk
+        self.driver = driver
+        if driver == "spidev":
+            if spidev is None:
+                raise RuntimeError("brak modułu spidev")
+            self._dev = spidev.SpiDev()
+            self._dev.open(0, channel)
+            self._dev.max_speed_hz = baud
+            self._dev.mode = 0
+            self._handle = None
+        else:
+            self._dev = None
+            self._handle = pi.spi_open(channel, baud, 0)
+
+    def send(self, frame, nbits, pinout):
+        self.send_bytes(frame_to_bytes(frame, nbits))
+
+    def send_bytes(self, data):
+        """Gotowe bajty (MSB pierwszy, jak FrameComposer.to_bytes) i impuls RCLK."""
+        if self._dev is not None:
+            self._dev.writebytes2(data)
+        else:
+            self.pi.spi_write(self._handle, data)
+        # jeden impuls RCLK jednym wywołaniem
+        self.pi.gpio_trigger(self.rclk, RCLK_PULSE_US, 1)
+
+    def xfer(self, frame, nbits):
+        """
+        Przesuwa ramkę bez zatrzaśnięcia i zwraca to, co wyszło z Q7' na MISO,
+        czyli poprzednią zawartość rejestru przesuwnego.
+        """
+        data = frame_to_bytes(frame, nbits)
+        if self._dev is not None:
+            rx = bytes(self._dev.xfer2(list(data)))
+        else:
+            _, rx = self.pi.spi_xfer(self._handle, data)
+        # nadmiarowe bity z przodu (do pełnego bajtu) wychodzą na końcu – odcinamy
+        return int.from_bytes(rx, "big") >> (len(data) * 8 - nbits)
+
+    def close(self):
+        if self._dev is not None:
+            self._dev.close()
+        else:
+            self.pi.spi_close(self._handle)
+
+
+class WaveTransmitter:
+    """
+    Wysyła ramkę 595 jako jeden waveform pigpio.
+    Dane, takty SRCLK i zbocze RCLK składamy w listę impulsów, pigpiod odtwarza
+    ją przez DMA, więc cała ramka to jedno wywołanie zamiast ~100 zapisów.
+    Gotowe waveformy są trzymane w cache (LRU) i używane ponownie dla tych samych ramek.
+    """
+
+    def __init__(
+        self, pi, srclk=SRCLK, rclk=RCLK, step_us=WAVE_STEP_US, cache_size=WAVE_CACHE_SIZE
+    ):
+        self.pi = pi
+        self.srclk_mask = 1 << srclk
+        self.rclk_mask = 1 << rclk
+        self.step_us = step_us
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # ((pin, ramka, nbits), ...) -> (wave_id, impulsy)
+        self._pulses = 0
+        self.hits = 0
+        self.misses = 0
+        # waveformy żyją w pigpiod dłużej niż nasz proces – czyścimy stare
+        self.pi.wave_clear()
+
+    def _build(self, steps, data_mask, step_us=None, latch=True):
+        clk = self.srclk_mask
+        t = step_us or self.step_us
+        pulses = []
+        for on in steps:
+            # ustaw dane przy niskim SRCLK, potem zbocze narastające SRCLK
+            pulses.append(pigpio.pulse(on, (data_mask & ~on) | clk, t))
+            pulses.append(pigpio.pulse(clk, 0, t))
+        if latch:
+            # zatrzaśnięcie: SRCLK w dół, impuls RCLK
+            pulses.append(pigpio.pulse(self.rclk_mask, clk, t))
+            pulses.append(pigpio.pulse(0, self.rclk_mask, t))
+        else:
+            pulses.append(pigpio.pulse(0, clk, t))
+
+        self.pi.wave_add_generic(pulses)
+        return self.pi.wave_create(), len(pulses)
+
+    def _evict_oldest(self):
+        _, (wid, count) = self._cache.popitem(last=False)
+        self._pulses -= count
+        # nie kasujemy waveformu, który może być jeszcze w trakcie nadawania
+        self.wait_idle()
+        self.pi.wave_delete(wid)
+
+    def wait_idle(self):
+        while self.pi.wave_tx_busy():
+            time.sleep(0.00005)
+
+    def send(self, frame, nbits, pinout):
+        self.send_parallel(((pinout, frame, nbits),))
+
+    def send_parallel(self, chains):
+        """Kilka łańcuchów na wspólnym SRCLK w jednym waveformie."""
+        key = tuple(chains)
+        entry = self._cache.get(key)
+        if entry is None:
+            self.misses += 1
+            nbits = max(n for _, _, n in chains)
+            needed = 2 * nbits + 2
+            while self._cache and (
+                len(self._cache) >= self.cache_size
+                or self._pulses + needed > WAVE_PULSE_BUDGET
+            ):
+                self._evict_oldest()
+            data_mask = 0
+            for pin, _, _ in chains:
+                data_mask |= 1 << pin
+            entry = self._build(parallel_steps(chains, nbits), data_mask)
+            self._cache[key] = entry
+            self._pulses += entry[1]
+        else:
+            self.hits += 1
+            self._cache.move_to_end(key)
+        wid = entry[0]
+        # SYNC: poczekaj aż poprzednia ramka skończy się nadawać, nie przerywaj jej
+        self.pi.wave_send_using_mode(wid, pigpio.WAVE_MODE_ONE_SHOT_SYNC)
+
+    def shift(self, frame, nbits, pinout, step_us=None):
+        """
+        Przesuwa ramkę jednorazowym waveformem (poza cache) bez impulsu RCLK –
+        wyjścia stoją. Do diagnostyki kroku, patrz find_min_wave_step.
+        """
+        self.wait_idle()
+        steps = parallel_steps(((pinout, frame, nbits),), nbits)
+        wid, _ = self._build(steps, 1 << pinout, step_us, latch=False)
+        try:
+            self.pi.wave_send_using_mode(wid, pigpio.WAVE_MODE_ONE_SHOT_SYNC)
+            self.wait_idle()
+        finally:
+            self.pi.wave_delete(wid)
+
+    def clear(self):
+        self.wait_idle()
+        self._cache.clear()
+        self._pulses = 0
+        self.pi.wave_clear()
+
+    def close(self):
+        self.clear()
+
+
+OUTPUT_BACKENDS = {
+    "bitbang": BitBangTransmitter,
+    "wave": WaveTransmitter,
+    "spi": SpiTransmitter,
+}
+
+
+def make_transmitter(mode):
+    """Tworzy nadajnik wg konfiguracji; gdy się nie da – zostaje bitbang."""
+    cls = OUTPUT_BACKENDS.get(mode)
+    if cls is None:
+        print(f"Nieznany OUTPUT_MODE={mode!r}, zostaje bitbang")
+    elif cls is not BitBangTransmitter and pi is not None:
+        try:
+            return cls(pi)
+        except Exception as e:
+            print(f"Nadajnik {mode} niedostępny, zostaje bitbang:", e)
+    if mode == "spi":
+        # bez SPI łańcuch i tak wisi na MOSI/SCLK – taktujemy je ręcznie
+        _spi_pins_mode(pigpio.OUTPUT)
+    return _bitbang_tx
+
+
+# tworzone przy połączeniu ze sprzętem (_connect_hardware)
+_bitbang_tx = None
+_tx = None
+
+
+def _make_bitbang():
+    """Bitbang po pinach, na których łańcuch faktycznie jest (przy SPI: MOSI/SCLK)."""
+    if OUTPUT_MODE == "spi":
+        return BitBangTransmitter(pins, srclk=SPI_SCLK, data_pins={SER_1: SPI_MOSI})
+    return BitBangTransmitter(pins)
+
+
+def _spi_pins_mode(mode):
+    """MOSI/SCLK: ALT0 dla sprzętowego SPI albo OUTPUT, gdy taktujemy je ręcznie."""
+    for pin in (SPI_MOSI, SPI_SCLK):
+        pins.set_mode(pin, mode)
+
+
+def _fall_back_to_bitbang(error):
+    global _tx
+    print("Błąd nadajnika, przechodzę na bitbang:", error)
+    old, _tx = _tx, _bitbang_tx
+    if isinstance(old, SpiTransmitter):
+        # łańcuch zostaje na MOSI/SCLK – zabieramy je SPI, żeby bitbang mógł nimi ruszać
+        try:
+            old.close()
+        except Exception:
+            pass
+        _spi_pins_mode(pigpio.OUTPUT)
+
+
+def set_output_mode(mode):
+    global _tx
+    old = _tx
+    _tx = make_transmitter(mode)
+    if old is not _tx and hasattr(old, "close"):
+        old.close()
+
+
+def shift_out_frame(frame, nbits, pinout):
+    if _tx is not _bitbang_tx:
+        try:
+            _tx.send(frame, nbits, pinout)
+            return
+        except Exception as e:
+            _fall_back_to_bitbang(e)
+    _bitbang_tx.send(frame, nbits, pinout)
+
+
+def shift_out_packed(data, frame, nbits, pinout):
+    """Jak shift_out_frame, ale SPI dostaje od razu gotowe bajty (data = ramka MSB pierwszy)."""
+    if isinstance(_tx, SpiTransmitter):
+        try:
+            _tx.send_bytes(data)
+            return
+        except Exception as e:
+            _fall_back_to_bitbang(e)
+    shift_out_frame(frame, nbits, pinout)
+
+
+def shift_out_parallel(chains):
+    """chains: lista (pin, ramka, nbits) łańcuchów na wspólnym SRCLK/RCLK."""
+    chains = tuple(chains)
+    send = getattr(_tx, "send_parallel", None)
+    if send is not None and _tx is not _bitbang_tx:
+        try:
+            send(chains)
+            return
+        except Exception as e:
+            _fall_back_to_bitbang(e)
+    # SPI ma tylko jedną linię danych – tu zostają operacje bankowe
+    _bitbang_tx.send_parallel(chains)
+
+
 def shift_out(bit_list, pinout):
-    # pierwszy bit na liście -> pierwszy wysłany -> trafia na ostatni rejestr
-    # dlatego trzeba odwrócić
-    for bit in reversed(bit_list):
-        pi.write(pinout, bit)
-        pi.write(SRCLK, 1)
-        pi.write(SRCLK, 0)
-    pi.write(RCLK, 1)
-    pi.write(RCLK, 0)
+    # pierwszy bit na liście -> ostatni wysłany -> pierwsze wyjście łańcucha
+    shift_out_frame(bits_to_frame(bit_list), len(bit_list), pinout)
+
+
+def shift_out_bitbang(bit_list, pinout):
+    _bitbang_tx.send(bits_to_frame(bit_list), len(bit_list), pinout)
+
+
+class OutputWriter:
+    """
+    Jedyny wątek, który dotyka łańcucha 595.
+    Wołający tylko wystawiają ramkę (post) i wracają od razu. Wątek zatrzaskuje
+    zawsze najnowszą: ramki, które przyszły w trakcie wysyłania poprzedniej,
+    są scalane (wygrywa ostatnia), a ramki identyczne z zatrzaśniętą – pomijane.
+    post() bez ramki tylko zaznacza zmianę stanu – ramkę składa wtedy sam wątek
+    (compose) tuż przed wysłaniem, więc starsza migawka nie nadpisze nowszej.
+    """
+
+    def __init__(self, send, compose=None):
+        self._send = send
+        self._compose = compose
+        self._cond = threading.Condition()
+        self._pending = None
+        self._has_pending = False
+        self._after = None  # operacja do wykonania zaraz po zatrzaśnięciu (apply_state)
+        self._busy = False
+        self._last = None  # ostatnio zatrzaśnięta ramka (None = nieznana)
+        self._thread = None
+        self.posted = 0
+        self.written = 0
+        self.coalesced = 0  # nadpisane przez nowszą zanim zostały wysłane
+        self.skipped = 0  # identyczne z tym, co już jest na wyjściach
+        self.errors = 0
+
+    def start(self):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, daemon=True)
+                self._thread.start()
+
+    def post(self, frame=None, force=False, after=None):
+        with self._cond:
+            self.posted += 1
+            if force:
+                self._last = None
+            if self._has_pending:
+                self.coalesced += 1
+            self._pending = frame
+            self._has_pending = True
+            if after is not None:
+                self._after = after
+            self._cond.notify()
+        if self._thread is None:
+            self.start()
+
+    def flush(self, timeout=None):
+        """Czeka aż wszystko, co wystawiono, zostanie zatrzaśnięte."""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._has_pending and not self._busy, timeout
+            )
+
+    def stats(self):
+        with self._cond:
+            return {
+                "posted": self.posted,
+                "written": self.written,
+                "coalesced": self.coalesced,
+                "skipped": self.skipped,
+                "errors": self.errors,
+            }
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+                self._cond.wait_for(lambda: self._has_pending)
+                frame = self._pending
+                after = self._after
+                self._has_pending = False
+                self._after = None
+                self._busy = True
+
+            try:
+                if frame is None:
+                    frame = self._compose()
+                if frame == self._last and after is None:
+                    self.skipped += 1
+                    continue
+                if frame != self._last:
+                    self._send(frame)
+                    self._last = frame
+                    self.written += 1
+                if after is not None:
+                    after()
+            except Exception as e:
+                self.errors += 1
+                self._last = None
+                print("Błąd zapisu łańcucha 595:", e)
+
+
+def _latch_frame(frame):
+    if chain is not None:
+        if frame == chain.frame():
+            # bufor composera to już bajty na drut (przepakowane tylko zmienione) – bez int -> bytes
+            shift_out_packed(chain.to_bytes(), frame, chain.nbits, SER_1)
+        else:
+            shift_out_frame(frame, chain.nbits, SER_1)
+    elif KEYS_ECHO:
+        registers, manual_1, manual_2, pedal = frame
+        shift_out_parallel(
+            (
+                (SER_1, registers, NUM_REGISTERS),
+                (SER_MANUAL_1, manual_1, NUM_MANUAL_KEYS),
+                (SER_MANUAL_2, manual_2, NUM_MANUAL_KEYS),
+                (SER_PEDAL, pedal, NUM_PEDAL_KEYS),
+            )
+        )
+    else:
+        shift_out_frame(frame, NUM_REGISTERS, SER_1)
+
+
+chain_lock = threading.Lock()  # łańcuch 595: writer albo diagnostyka, nigdy oba
+
+verify_counters = {"checked": 0, "errors": 0, "last_error": None}
+
 
+def _main_chain(frame):
+    """(ramka, nbits) łańcucha na SER_1, z którego Q7' wraca do RPi."""
+    if chain is not None:
+        return frame, chain.nbits
+    if KEYS_ECHO:
+        return frame[0], NUM_REGISTERS
+    return frame, NUM_REGISTERS
 
-def shift_out_from_cords():
-    # bierzemy 1..32 w kolejności rosnącej
-    bit_list = [cords[k] for k in sorted(cords.keys(), key=lambda x: int(x))]
-    shift_out(bit_list, SER_1)
+
+def _read_q7s():
+    if VERIFY_MODE == "165":
+        # read_165_frame (skrypt, jeśli jest) bierze lock_165 – nie wchodzi w drogę wątkowi skanu
+        return (read_165_frame() >> VERIFY_165_BIT) & 1
+    return pins.read(VERIFY_PIN)
+
+
+def readback(frame, nbits):
+    """
+    Przesuwa ramkę jeszcze raz (bez RCLK, wyjścia się nie zmieniają) i czyta Q7'
+    przed każdym taktem – wychodzi dokładnie to, co siedzi w rejestrze przesuwnym.
+    """
+    if VERIFY_MODE == "spi":
+        spi = _tx if isinstance(_tx, SpiTransmitter) else None
+        if spi is None:
+            raise RuntimeError("weryfikacja spi wymaga OUTPUT_MODE=spi")
+        return spi.xfer(frame, nbits)
+    data, clk = _bitbang_tx.data_pin(SER_1), _bitbang_tx.srclk
+    spi = isinstance(_tx, SpiTransmitter)
+    if spi:
+        # SPI nie przeplata odczytu Q7' z taktami – na czas odczytu MOSI/SCLK ręcznie
+        _spi_pins_mode(pigpio.OUTPUT)
+    try:
+        got = 0
+        for i in range(nbits - 1, -1, -1):
+            got = (got << 1) | _read_q7s()
+            pins.write(data, (frame >> i) & 1)
+            pins.write(clk, 1)
+            pins.write(clk, 0)
+        return got
+    finally:
+        if spi:
+            _spi_pins_mode(pigpio.ALT0)
+
+
+def verify_frame(frame, nbits):
+    got = readback(frame, nbits)
+    verify_counters["checked"] += 1
+    if got != frame:
+        verify_counters["errors"] += 1
+        verify_counters["last_error"] = {
+            "sent": hex(frame),
+            "read": hex(got),
+            "bad_bits": [i + 1 for i in range(nbits) if ((got ^ frame) >> i) & 1],
+        }
+        print(f"Weryfikacja 595: wysłano {frame:#x}, odczytano {got:#x}")
+        return False
+    return True
+
+
+def verify_stats():
+    return dict(verify_counters)
+
+
+def _write_chain(frame):
+    # wątek writera czeka na sprzęt; do tego czasu ramki się scalają (wygrywa ostatnia)
+    ensure_hardware()
+    with chain_lock:
+        try:
+            _latch_frame(frame)
+        except Exception as e:
+            hardware_lost(e)
+            raise
+        if VERIFY_MODE != "off" and random.random() < VERIFY_SAMPLE:
+            # waveform leci z DMA asynchronicznie – odczyt dopiero, gdy piny są wolne
+            wait_idle = getattr(_tx, "wait_idle", None)
+            if wait_idle is not None:
+                wait_idle()
+            verify_frame(*_main_chain(frame))
+
+
+def find_max_spi_baud(bauds=SPI_BAUD_STEPS, frames=200):
+    """
+    Szuka najwyższej częstotliwości SPI, przy której łańcuch (Q7' na MISO)
+    oddaje bezbłędnie losowe ramki. Nic nie jest zatrzaskiwane, wyjścia stoją.
+    Zwraca (najlepszy_baud albo None, {baud: liczba_błędów}).
+    """
+    nbits = chain.nbits if chain is not None else NUM_REGISTERS
+    results = {}
+    best = None
+    with chain_lock:
+        for baud in bauds:
+            try:
+                spi = SpiTransmitter(pi, baud=baud)
+            except Exception as e:
+                print(f"SPI {baud} Hz niedostępne:", e)
+                break
+            errors = 0
+            try:
+                for _ in range(frames):
+                    frame = random.getrandbits(nbits)
+                    spi.xfer(frame, nbits)
+                    if spi.xfer(frame, nbits) != frame:
+                        errors += 1
+            finally:
+                spi.close()
+            results[baud] = errors
+            if errors:
+                break
+            best = baud
+    return best, results
+
+
+def find_min_wave_step(steps=WAVE_STEP_STEPS, frames=200):
+    """
+    Szuka najkrótszego WAVE_STEP_US, przy którym łańcuch przyjmuje bezbłędnie
+    losowe ramki: każda jest wpychana waveformem (bez RCLK, wyjścia stoją)
+    i odczytywana zwrotnie przez Q7' (readback, VERIFY_MODE != off).
+    Zwraca (najlepszy_krok albo None, {krok: liczba_błędów}).
+    """
+    if not isinstance(_tx, WaveTransmitter):
+        raise RuntimeError("szukanie kroku wymaga OUTPUT_MODE=wave")
+    if VERIFY_MODE == "off":
+        raise RuntimeError("szukanie kroku wymaga ORGANY_VERIFY=gpio|165|spi")
+    nbits = chain.nbits if chain is not None else NUM_REGISTERS
+    results = {}
+    best = None
+    with chain_lock:
+        for step in sorted(steps, reverse=True):
+            errors = 0
+            for _ in range(frames):
+                frame = random.getrandbits(nbits)
+                _tx.shift(frame, nbits, SER_1, step)
+                # readback wypycha to, co wsunął waveform, i wsuwa tę samą ramkę
+                if readback(frame, nbits) != frame:
+                    errors += 1
+            results[step] = errors
+            if errors:
+                break
+            best = step
+    return best, results
+
+
+output_writer = OutputWriter(_write_chain, organ.frame)
+
+
+def shift_out_from_cords(force=False):
+    # ramkę składa ze stanu organ dopiero wątek output_writer
+    output_writer.post(None, force)
+
+
+def update_keys(status, note, velocity):
+    """Echo MIDI note on/off na LED-ach klawiatur (kanały 0,1 – manuały, 2 – pedał)."""
+    if not KEYS_ECHO:
+        return
+    msg_type = status & 0xF0
+    if msg_type not in (0x80, 0x90):
+        return
+    organ.set_key(status & 0x0F, note, msg_type == 0x90 and velocity > 0)
+    output_writer.post()
+
+
+def set_chain_section(name, value):
+    """Ustawia dowolną sekcję długiego łańcucha (np. "lamps") i wysyła ramkę."""
+    if chain is None or not chain.has(name) or name == "divisions":
+        return False
+    if organ.sections.get(name) != value:
+        organ.sections[name] = value
+        output_writer.post()
+    return True
+
+
+def output_stats():
+    return output_writer.stats()
+
+
+def _state_bank_bits(keyboard_disabled):
+    """Maski (ustaw, skasuj) banku 1 dla pinów kopli i blokady klawiatury wg organ."""
+    set_bits = clear_bits = 0
+    for type, pin in COPEL_PINS.items():
+        if organ.copel(type):
+            set_bits |= 1 << pin
+        else:
+            clear_bits |= 1 << pin
+    if keyboard_disabled is not None:
+        # jak disable_keyboard: zablokowana = 0 na MIDI
+        if keyboard_disabled:
+            clear_bits |= 1 << MIDI
+        else:
+            set_bits |= 1 << MIDI
+    return set_bits, clear_bits
+
+
+def apply_state(registers, copels=None, keyboard_disabled=None, timeout=1.0):
+    """
+    Cały stan naraz: rejestry, kople 100/101/102 i (opcjonalnie) blokada klawiatury.
+    Rejestry idą jednym transferem łańcucha, a zaraz po zatrzaśnięciu – w tym samym
+    wątku – piny kopli i MIDI jednym zapisem banku. Zamiast pięciu osobnych operacji.
+    registers/copels to numery (np. "combination" z tracks.json); bez copels kople
+    są brane z registers. Zwraca czas od wywołania do zastosowania w sekundach
+    albo None, gdy łańcuch nie zdążył w timeout.
+    """
+    global _keyboard_disabled
+    start = time.perf_counter()
+    numbers = [int(i) for i in registers]
+    selected = numbers if copels is None else [int(i) for i in copels]
+    if keyboard_disabled is not None:
+        # jak disable_keyboard – _restore_outputs odtworzy to po ponownym połączeniu
+        _keyboard_disabled = keyboard_disabled == True
+    organ.set_registers(numbers)
+    for type in COPEL_BITS:
+        organ.set_copel(type, type in selected)
+    set_bits, clear_bits = _state_bank_bits(keyboard_disabled)
+
+    def write_bank():
+        if clear_bits:
+            pins.clear_bank_1(clear_bits)
+        if set_bits:
+            pins.set_bank_1(set_bits)
+
+    # bez force: niezmienione rejestry nie są przesuwane, a write_bank i tak się wykona
+    output_writer.post(None, False, write_bank)
+    if not output_writer.flush(timeout):
+        print("apply_state: łańcuch nie zdążył w", timeout, "s")
+        return None
+    return time.perf_counter() - start
 
 
 def update_cords_divisions(selected_ids):
-    for key in cords:
-        cords[key] = 0
-    for i in selected_ids:
-        key = str(i)
-        if key in cords:
-            cords[key] = 1
-    bit_list = [cords[key] for key in sorted(cords.keys(), key=lambda x: int(x))]
+    organ.set_registers(selected_ids)
     shift_out_from_cords()
 
 
 # ======= 74HC165 =======
-def read_165_bits(num_chips=NUM_165):
+SCRIPT_MAX_BITS = 320  # skrypt pigpio ma 10 parametrów po 32 bity
+
+
+def build_scan_script(num_bits, pl=PIN_165_PL, cp=PIN_165_CP, q7=PIN_165_Q7, load=True):
+    """
+    Skrypt pigpio: impuls PL, potem num_bits razy odczyt Q7 i takt CP.
+    Bity trafiają do parametrów p0..p9 po 32 na słowo; pierwszy odczytany
+    bit to bit 0 (tak jak bits[0] w read_165_bits).
+    load=False – bez impulsu PL, dalszy ciąg łańcucha dłuższego niż 320 bitów.
+    """
+    lines = [f"w {pl} 0", "mics 1", f"w {pl} 1"] if load else []
+    words = (num_bits + 31) // 32
+    for w in range(words):
+        count = min(32, num_bits - 32 * w)
+        lines += [
+            f"ld p{w} 0",
+            f"ld v0 {count}",
+            f"tag {w}",
+            # p = (p >> 1) | (bit << 31) – rotacja w prawo, nowy bit na górę
+            f"rr p{w} 1",
+            f"r {q7}",
+            "rla 31",
+            f"or p{w}",
+            f"sta p{w}",
+            f"w {cp} 1",
+            f"w {cp} 0",
+            "dcr v0",
+            "lda v0",
+            f"jnz {w}",
+        ]
+        if count < 32:
+            # niepełne słowo – dosuń do bitu 0
+            lines.append(f"rr p{w} {32 - count}")
+    lines.append("halt")
+    return " ".join(lines)
+
+
+class ScriptScanner:
+    """
+    Odczyt łańcucha 165 wykonywany w całości wewnątrz pigpiod.
+    Skrypt jest zapisywany raz (store_script), każdy skan to run_script
+    i krótkie oczekiwanie na script_status – zamiast ~100 rund po sockecie.
+    Łańcuch dłuższy niż 320 bitów jest czytany kilkoma skryptami po kolei
+    (tylko pierwszy robi impuls PL).
+    """
+
+    def __init__(self, pi, num_bits):
+        self.pi = pi
+        self.num_bits = num_bits
+        self.parts = []  # [(id skryptu, liczba bitów)]
+        try:
+            for start in range(0, num_bits, SCRIPT_MAX_BITS):
+                count = min(SCRIPT_MAX_BITS, num_bits - start)
+                script = build_scan_script(count, load=start == 0)
+                sid = pi.store_script(script.encode())
+                self.parts.append((sid, count))
+                self._wait(sid)
+        except Exception:
+            self.close()
+            raise
+
+    def _wait(self, sid):
+        while True:
+            status, params = self.pi.script_status(sid)
+            if status == pigpio.PI_SCRIPT_HALTED:
+                return params
+            if status == pigpio.PI_SCRIPT_FAILED:
+                raise RuntimeError("skrypt odczytu 165 nie powiódł się")
+            time.sleep(0.00002)
+
+    def scan(self):
+        value = 0
+        shift = 0
+        for sid, count in self.parts:
+            self.pi.run_script(sid)
+            params = self._wait(sid)
+            for w in range((count + 31) // 32):
+                value |= (params[w] & 0xFFFFFFFF) << (shift + 32 * w)
+            shift += count
+        return value
+
+    def close(self):
+        for sid, _ in self.parts:
+            try:
+                self.pi.delete_script(sid)
+            except Exception:
+                pass
+        self.parts = []
+
+
+_scanners = {}
+
+
+def _script_scanner(num_bits):
+    """Skaner dla danej długości łańcucha (None, gdy skrypt niedostępny)."""
+    if num_bits not in _scanners:
+        scanner = None
+        if SCAN_MODE == "script" and pi is not None and GPIO_BACKEND == "pigpio":
+            try:
+                scanner = ScriptScanner(pi, num_bits)
+                # skrypty żyją w pigpiod (max 32) – sprzątamy przy wyjściu
+                atexit.register(scanner.close)
+            except Exception as e:
+                print("Skrypt odczytu 165 niedostępny, zostaje bitbang:", e)
+        _scanners[num_bits] = scanner
+    return _scanners[num_bits]
+
+
+# łańcuch 165: wątek skanu i weryfikacja 595 przez Q7' (VERIFY_MODE=165) nie mogą taktować naraz
+lock_165 = threading.Lock()
+
+
+def read_165_frame(num_chips=NUM_165):
+    """Stan wejść jako int: bit i = bits[i] z read_165_bits (po uwzględnieniu ACTIVE_LOW)."""
+    total_bits = num_chips * 8
+    with lock_165:
+        scanner = _script_scanner(total_bits)
+        if scanner is not None:
+            try:
+                value = scanner.scan()
+            except Exception as e:
+                print("Błąd skryptu 165, przechodzę na bitbang:", e)
+                _scanners[total_bits] = None
+            else:
+                if ACTIVE_LOW_165:
+                    value ^= (1 << total_bits) - 1
+                return value
+
+        return _shift_in_165(num_chips)
+
+
+def read_165_packed(num_chips=NUM_165):
+    """Bitbang łańcucha prosto do inta (bez listy), ACTIVE_LOW jednym XOR na końcu."""
+    with lock_165:
+        return _shift_in_165(num_chips)
+
+
+def _shift_in_165(num_chips):
     total_bits = num_chips * 8
     # Załaduj równolegle wejścia do rejestru (aktywny niski)
-    pi.write(PIN_165_PL, 0)
+    pins.write(PIN_165_PL, 0)
     # krótka pauza na pewność
     time.sleep(0.000001)
-    pi.write(PIN_165_PL, 1)
+    pins.write(PIN_165_PL, 1)
 
-    bits = []
-    for _ in range(total_bits):
+    read, write = pins.read, pins.write
+    frame = 0
+    for i in range(total_bits):
         # odczytaj aktualny Q7
-        bit = pi.read(PIN_165_Q7)
-        if ACTIVE_LOW_165:
-            bit = 1 - bit
-        bits.append(bit)
+        if read(PIN_165_Q7):
+            frame |= 1 << i
         # i przesuń dalej
-        pi.write(PIN_165_CP, 1)
-        pi.write(PIN_165_CP, 0)
+        write(PIN_165_CP, 1)
+        write(PIN_165_CP, 0)
+
+    if ACTIVE_LOW_165:
+        frame ^= (1 << total_bits) - 1
+    return frame
 
-    return bits  # lista 32 elementów 0/1
+
+def read_165_bits(num_chips=NUM_165):
+    """Jak dawniej: lista 0/1, bits[i] = i-ty odczytany bit."""
+    frame = read_165_packed(num_chips)
+    return [(frame >> i) & 1 for i in range(num_chips * 8)]
+
+
+def frame_to_indices(mask):
+    """Numery ustawionych bitów – koszt zależy od liczby jedynek, nie od długości łańcucha."""
+    out = []
+    while mask:
+        low = mask & -mask
+        out.append(low.bit_length() - 1)
+        mask ^= low
+    return out
 
 
 def bits_to_bytes(bits):
@@ -192,145 +1334,557 @@ def bits_to_bytes(bits):
 
 
 # ======= ENKODER =======
-def read_encoder(socket):
-    global position, last_encoded
-    MSB = pi.read(ENC_CLK)
-    LSB = pi.read(ENC_DT)
-    encoded = (MSB << 1) | LSB
-    sum_ = (last_encoded << 2) | encoded
+# krok dla przejścia (poprzedni << 2) | obecny, gdzie stan = (CLK << 1) | DT;
+# 0 dla braku zmiany i niedozwolonych przeskoków o dwa stany
+ENC_STEPS = (
+    0, -1, +1, 0,
+    +1, 0, 0, -1,
+    -1, 0, 0, +1,
+    0, +1, -1, 0,
+)
 
-    if sum_ in [0b1101, 0b0100, 0b0010, 0b1011]:
-        position += 1
-    elif sum_ in [0b1110, 0b0111, 0b0001, 0b1011]:
-        position -= 1
+_crescendo_socket = None
 
-    # poprawka: prawidłowy kod
-    if sum_ in [0b1110, 0b0111, 0b0001, 0b1000]:
-        position -= 1
 
-    last_encoded = encoded
-    position = max(0, min(48, position))
+def _emit_crescendo(value):
+    if _crescendo_socket:
+        _crescendo_socket.emit("crescendo", {"cres": value})
+
+
+crescendo_emits = Throttle(CRESCENDO_EMIT_HZ, _emit_crescendo)
+
+
+def read_encoder(socket):
+    MSB = pins.read(ENC_CLK)
+    LSB = pins.read(ENC_DT)
+    decode_encoder((MSB << 1) | LSB, socket)
 
+
+def decode_encoder(encoded, socket):
+    """Krok enkodera z gotowego stanu (CLK << 1) | DT – bez odczytu pinów."""
+    global position, last_encoded, _crescendo_socket
+    step = ENC_STEPS[(last_encoded << 2) | encoded]
+    last_encoded = encoded
+    if not step:
+        return
+    new = min(CRESCENDO_MAX, max(0, position + step))
+    if new == position:
+        return
+    position = new
+    apply_crescendo(new)
+    # szybki ruch pedałem daje setki zboczy – do UI idzie kilka wartości, zawsze ostatnia
     if socket:
-        socket.emit("crescendo", {"cres": position})
+        _crescendo_socket = socket
+        crescendo_emits.post(new)
+
+
+def apply_crescendo(pos):
+    """Ustawia rejestry walca dla pozycji i od razu wysyła ramkę (jedno odczytanie z tablicy)."""
+    if crescendo_table is None:
+        return
+    mask = crescendo_table[pos]
+    if mask != organ.crescendo:
+        organ.crescendo = mask
+        shift_out_from_cords()
+
+
+def _set_encoder_glitch_filter():
+    """
+    Filtr drgań na CLK/DT: w pigpiod (działa i dla callbacków, i dla potoku
+    powiadomień), a gdy zdarzenia idą z gpiochip – okres debounce linii w jądrze.
+    SimPins/GpioMem filtra nie mają.
+    """
+    if not ENC_GLITCH_US:
+        return
+    targets = []
+    if pi is not None:
+        targets.append(pi)
+    if events is not pi and hasattr(events, "set_glitch_filter"):
+        targets.append(events)
+    for target in targets:
+        for pin in (ENC_CLK, ENC_DT):
+            try:
+                target.set_glitch_filter(pin, ENC_GLITCH_US)
+            except Exception as e:
+                print("Filtr drgań enkodera niedostępny:", e)
+                break
 
 
 def register_encoder_callbacks(socket):
-    pi.callback(ENC_CLK, pigpio.EITHER_EDGE, lambda g, l, t: read_encoder(socket))
-    pi.callback(ENC_DT, pigpio.EITHER_EDGE, lambda g, l, t: read_encoder(socket))
+    # poziom z callbacku (po filtrze drgań), a nie ponowny pi.read – ten widziałby drgania
+    levels = {ENC_CLK: pins.read(ENC_CLK), ENC_DT: pins.read(ENC_DT)}
+
+    def on_edge(gpio, level, tick):
+        levels[gpio] = level
+        decode_encoder((levels[ENC_CLK] << 1) | levels[ENC_DT], socket)
+
+    events.callback(ENC_CLK, pigpio.EITHER_EDGE, on_edge)
+    events.callback(ENC_DT, pigpio.EITHER_EDGE, on_edge)
+
+
+edge_stream = None
+
+
+def _start_notify_edges(socket):
+    global edge_stream
+    enc_mask = (1 << ENC_CLK) | (1 << ENC_DT)
+
+    def on_edges(changed, levels, tick):
+        if changed & enc_mask:
+            decode_encoder((((levels >> ENC_CLK) & 1) << 1) | ((levels >> ENC_DT) & 1), socket)
+        if changed & (1 << POWER_OFF) and not (levels >> POWER_OFF) & 1:
+            power_off_callback(0, socket)
+
+    if edge_stream is not None:
+        edge_stream.close()
+    edge_stream = NotifyStream(pi, (ENC_CLK, ENC_DT, POWER_OFF), on_edges)
+    atexit.register(edge_stream.close)
+
+
+def start_edge_inputs(socket):
+    """Enkoder i POWER_OFF: potok powiadomień (EDGE_MODE=notify) albo callbacki."""
+    _set_encoder_glitch_filter()
+    if EDGE_MODE == "notify":
+        if pi is None:
+            print("Potok powiadomień wymaga pigpiod, zostają callbacki")
+        else:
+            try:
+                _start_notify_edges(socket)
+                return "notify"
+            except Exception as e:
+                print("Potok powiadomień niedostępny, zostają callbacki:", e)
+    register_encoder_callbacks(socket)
+    events.callback(
+        POWER_OFF,
+        pigpio.FALLING_EDGE,
+        lambda g, l, t: power_off_callback(l, socket),
+    )
+    return "callback"
+
+
+def edge_stats():
+    """Liczniki potoku powiadomień (None w trybie callback)."""
+    return edge_stream.stats() if edge_stream is not None else None
+
+
+# ======= ŚLEDZENIE: czasy operacji =======
+if tracer is not None:
+    shift_out_frame = tracer.timed("shift_out", shift_out_frame)
+    shift_out_parallel = tracer.timed("shift_out_parallel", shift_out_parallel)
+    read_165_bits = tracer.timed("read_165_bits", read_165_bits)
+    read_165_packed = tracer.timed("read_165_packed", read_165_packed)
+    read_165_frame = tracer.timed("read_165_frame", read_165_frame)
+    apply_copel = tracer.timed("apply_copel", apply_copel)
+    disable_keyboard = tracer.timed("disable_keyboard", disable_keyboard)
+
+
+def trace_report():
+    """Liczniki i czasy operacji (None, gdy śledzenie wyłączone)."""
+    return tracer.report() if tracer is not None else None
+
+
+def export_trace_vcd(path=None):
+    """Zrzuca zapamiętane zbocza do pliku VCD (domyślnie TRACE_VCD); zwraca liczbę próbek."""
+    if tracer is None:
+        raise RuntimeError("śledzenie wyłączone (ORGANY_TRACE=1)")
+    return tracer.export_vcd(path or TRACE_VCD or "./trace.vcd")
+
+
+if tracer is not None and TRACE_VCD:
+    atexit.register(export_trace_vcd)
 
 
 # ======= PĘTLA POLLUJĄCA 165 =======
 _last_165 = None
+_capture = None
+
+
+def start_capture_165(path):
+    """Zaczyna zapisywać surowe ramki 165 (tylko zmiany, z czasem) do pliku."""
+    global _capture
+    stop_capture_165()
+    _capture = FrameWriter(path, NUM_165 * 8)
+    print(f"Zapis ramek 165 do {path}")
+
+
+def stop_capture_165():
+    """Kończy zapis; zwraca liczbę zapisanych rekordów (None, gdy nic nie było zapisywane)."""
+    global _capture
+    if _capture is None:
+        return None
+    capture, _capture = _capture, None
+    capture.close()
+    return capture.records
+
+
+def _input_mask(numbers):
+    mask = 0
+    for i in numbers:
+        mask |= 1 << i
+    return mask
+
+
+debouncer = Debouncer(
+    NUM_165 * 8,
+    [(_input_mask(inputs), t) for inputs, t in DEBOUNCE_165_GROUPS],
+    DEBOUNCE_165_S,
+    1.0 / SCAN_IDLE_HZ,
+)
+
+
+# ======= MAPA WEJŚĆ (keymap.json) =======
+def _action_register(number, socket, next_step, previoust_step):
+    # rejestr 1..32 (sprawdzone w parse_keymap) → przełącz bit w stanie i wyślij
+    if 1 <= number <= NUM_REGISTERS:
+        organ.toggle_register(number)
+        shift_out_from_cords()
+    socket.emit("registers", {"number": number})
+
+
+def _action_copel(number, socket, next_step, previoust_step):
+    copels(number)
+    socket.emit("registers", {"number": number})
+
+
+def _action_tutti(_, socket, next_step, previoust_step):
+    socket.emit("TUTTI")
+    output_all_one(True)
+
+
+def _action_clear(_, socket, next_step, previoust_step):
+    socket.emit("clear")
+    output_all_one(False)
+
+
+def _action_previous_step(_, socket, next_step, previoust_step):
+    previoust_step()
+    print("poprzedni")
+
+
+def _action_next_step(_, socket, next_step, previoust_step):
+    next_step()
+    print("następny")
+
+
+custom_actions = {}
+
+
+def register_input_action(name, func):
+    """Akcja "custom" z mapy: func(socket, next_step, previoust_step)."""
+    custom_actions[name] = func
+
+
+def _action_custom(name, socket, next_step, previoust_step):
+    func = custom_actions.get(name)
+    if func is None:
+        print(f"Brak akcji {name!r}")
+        return
+    func(socket, next_step, previoust_step)
+
+
+_ACTION_HANDLERS = {
+    "register": _action_register,
+    "copel": _action_copel,
+    "tutti": _action_tutti,
+    "clear": _action_clear,
+    "previous_step": _action_previous_step,
+    "next_step": _action_next_step,
+    "custom": _action_custom,
+}
+
+
+def compile_keymap(entries):
+    """(akcja, arg) -> (funkcja, arg): w pętli zostaje indeks i wywołanie."""
+    return [None if e is None else (_ACTION_HANDLERS[e[0]], e[1]) for e in entries]
+
+
+input_table = [None] * (NUM_165 * 8)
+_keymap_mtime = None
+_keymap_checked = 0.0
+
+
+def reload_keymap(path=None):
+    """Wczytuje mapę od nowa; przy błędzie zostaje poprzednia. Zwraca True, gdy podmieniono."""
+    global input_table, _keymap_mtime
+    path = path or KEYMAP_PATH
+    try:
+        mtime = os.path.getmtime(path)
+        table = compile_keymap(load_keymap(path, NUM_165 * 8, NUM_REGISTERS, tuple(COPEL_BITS)))
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Nie wczytano mapy wejść {path}:", e)
+        return False
+    input_table = table  # jedno przypisanie – pętla skanu widzi starą albo nową
+    _keymap_mtime = mtime
+    print(f"Wczytano mapę wejść {path}")
+    return True
+
+
+def watch_keymap(now=None):
+    """Przeładowuje mapę, jeśli plik się zmienił (sprawdza najwyżej co KEYMAP_CHECK_S)."""
+    global _keymap_checked
+    now = time.monotonic() if now is None else now
+    if now - _keymap_checked < KEYMAP_CHECK_S:
+        return
+    _keymap_checked = now
+    try:
+        mtime = os.path.getmtime(KEYMAP_PATH)
+    except OSError:
+        return
+    if mtime != _keymap_mtime:
+        reload_keymap()
+
+
+reload_keymap()
+
+
+def _handle_input(item):
+    # wątek kolejki: tu mogą trwać odczyty tracks.json, kople i emisje
+    i, socket, next_step, previoust_step = item
+    entry = input_table[i]
+    if entry is not None:
+        entry[0](entry[1], socket, next_step, previoust_step)
+
+
+input_events = InputQueue(_handle_input, INPUT_QUEUE_SIZE)
+
+
+def input_stats():
+    """Głębokość kolejki zdarzeń wejść i opóźnienia obsługi (p50/p95/p99)."""
+    return input_events.stats()
+
+
+# wejście z Q7' łańcucha 595 zmienia się przy każdej ramce – to nie jest przycisk konsoli
+_VERIFY_165_MASK = ~(1 << VERIFY_165_BIT) if VERIFY_MODE == "165" else -1
 
 
 def poll_165_once(socket, next_step, previoust_step):
-    global _last_165, cords
-    bits = read_165_bits()
+    global _last_165
+    frame = read_165_frame() & _VERIFY_165_MASK
+    if _capture is not None:
+        _capture.record(frame)
     if _last_165 is None:
-        _last_165 = bits
+        _last_165 = frame
+        debouncer.reset(frame)
 
-    if bits != _last_165:
-        pressed = [
-            i
-            for i, (prev, now) in enumerate(zip(_last_165, bits))
-            if now == 1 and prev == 0
-        ]
-        if pressed:
-            for i in pressed:
-                # Mapowanie wejść -> rejestry
-                number = None
-                match i:
-                    case 0:
-                        number = 8
-                    case 1:
-                        number = 7
-                    case 2:
-                        number = 6
-                    case 3:
-                        number = 5
-                    case 4:
-                        number = 4
-                    case 5:
-                        number = 3
-                    case 6:
-                        number = 2
-                    case 7:
-                        number = 1
-                    case 8:
-                        number = 16
-                    case 9:
-                        number = 15
-                    case 10:
-                        number = 14
-                    case 11:
-                        number = 13
-                    case 12:
-                        number = 12
-                    case 13:
-                        number = 11
-                    case 14:
-                        number = 10
-                    case 15:
-                        number = 9
-                    case 16:
-                        number = 102
-                        copels(102)
-                    case 17:
-                        number = 101
-                        copels(101)
-                    case 18:
-                        number = 100
-                        copels(100)
-                    case 19:
-                        socket.emit("TUTTI")
-                        output_all_one(True)
-                    case 20:
-                        socket.emit("clear")
-                        output_all_one(False)
-                    case 21:
-                        previoust_step()
-                        print("poprzedni")
-                    case 22:
-                        next_step()
-                        print("następny")
-                    case 23:
-                        number = 17
-                    case 25:
-                        number = 25
-                    case 26:
-                        number = 26
-                    case 27:
-                        number = 27
-
-                # Jeśli jest numer rejestru → ustaw w cords i wyślij
-                if number is not None:
-                    if 1 <= number <= 32:
-                        key = str(number)
-                        cords[key] = 1 - cords[key]  # toggle bitu
-                        shift_out_from_cords()
-                        socket.emit("registers", {"number": number})
-                    else:
-                        # Funkcje pomocnicze, nie sterują wyjściami
-                        socket.emit("registers", {"number": number})
-
-            print(f"Kliknięto: {pressed}")
-
-    _last_165 = bits
+    # zbocza narastające po debounce: stabilnie 0 -> stabilnie 1
+    rising, _ = debouncer.update(frame)
+    if rising:
+        pressed = frame_to_indices(rising)
+        # obsługa w wątku kolejki – skaner od razu wraca do próbkowania
+        now = time.monotonic()
+        for i in pressed:
+            input_events.put((i, socket, next_step, previoust_step), now)
+        print(f"Kliknięto: {pressed}")
+
+    # do harmonogramu liczy się każda zmiana surowego odczytu (także drgania)
+    changed = frame != _last_165
+    _last_165 = frame
+    return changed
+
+
+scan_rate = AdaptiveRate(SCAN_IDLE_HZ, SCAN_ACTIVE_HZ, SCAN_ACTIVE_HOLD_S)
+scan_loop = DeadlineLoop()
+
+
+def scan_stats():
+    """Bieżące tempo skanowania 165 (mode/hz) i liczba wybudzeń."""
+    return scan_rate.stats()
+
+
+def scan_timing():
+    """Histogramy rzeczywistego okresu i czasu skanu oraz liczba przekroczeń terminu."""
+    return scan_loop.stats()
+
+
+def reset_scan_timing():
+    scan_loop.reset_stats()
+
+
+if CAPTURE_165:
+    start_capture_165(CAPTURE_165)
+    atexit.register(stop_capture_165)
+
+
+# ======= SPRZĘT: połączenie, gotowość, ponowne łączenie =======
+RECONNECT_MIN_S = 0.5  # pierwsza przerwa między próbami, potem x2
+RECONNECT_MAX_S = 10.0
+
+hardware_ready = threading.Event()
+_hw_lock = threading.Lock()
+_hw_thread = None
+_hw_status = {
+    "state": "idle",  # idle / connecting / waiting / ready / lost
+    "backend": GPIO_BACKEND,
+    "attempts": 0,
+    "connects": 0,
+    "last_error": None,
+    "ready_since": None,
+}
+_on_ready = []  # wołane po każdym (ponownym) połączeniu
+
+
+def _release_hardware():
+    """Zamyka to, co zostało po poprzednim połączeniu (np. po restarcie pigpiod)."""
+    global edge_stream
+    if edge_stream is not None:
+        edge_stream.close()
+        edge_stream = None
+    for obj in (pins, pi):
+        if obj is None or (obj is pins and pins is pi):
+            continue
+        try:
+            obj.stop()
+        except Exception:
+            pass
+
+
+def _connect_hardware():
+    global pi, pins, events, last_encoded, _bitbang_tx, _tx
+    new_pi, new_pins = _open_pins()
+    if tracer is not None:
+        # przy śledzeniu nadajnik i skan są bitbangiem (patrz TRACE), więc całość idzie przez "pins"
+        new_pins = TracedPins(new_pins, tracer)
+    pi, pins = new_pi, new_pins
+    events = pins if hasattr(pins, "callback") else pi
+    _init_pins()
+    last_encoded = (pins.read(ENC_CLK) << 1) | pins.read(ENC_DT)
+    # skrypty i waveformy żyły w poprzednim pigpiod
+    _scanners.clear()
+    _bitbang_tx = _make_bitbang()
+    _tx = make_transmitter(OUTPUT_MODE)
+
+
+def _restore_outputs():
+    """Po połączeniu: kople, blokada klawiatury i pełna ramka wg zapamiętanego stanu."""
+    for type in COPEL_PINS:
+        apply_copel(type)
+    if _keyboard_disabled is not None:
+        disable_keyboard(_keyboard_disabled)
+    output_writer.post(None, True)
+
+
+_on_ready.append(_restore_outputs)
+
+
+def _connect_loop():
+    # po utracie sprzętu start_hardware woła wątek skanu – nie dziedziczymy jego RT
+    leave_rt_profile()
+    delay = RECONNECT_MIN_S
+    while True:
+        _hw_status["attempts"] += 1
+        _hw_status["state"] = "connecting"
+        try:
+            _release_hardware()
+            _connect_hardware()
+        except Exception as e:
+            _hw_status["state"] = "waiting"
+            _hw_status["last_error"] = str(e)
+            print(f"Sprzęt niegotowy ({e}), ponowna próba za {delay:.1f} s")
+            time.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_S)
+            continue
+        _hw_status["state"] = "ready"
+        _hw_status["connects"] += 1
+        _hw_status["ready_since"] = time.time()
+        hardware_ready.set()
+        print(f"Sprzęt gotowy ({GPIO_BACKEND})")
+        for hook in list(_on_ready):
+            try:
+                hook()
+            except Exception as e:
+                print("Błąd po połączeniu ze sprzętem:", e)
+        return
+
+
+def start_hardware():
+    """Łączy ze sprzętem w tle (z ponawianiem); wraca od razu."""
+    global _hw_thread
+    with _hw_lock:
+        if hardware_ready.is_set() or (_hw_thread is not None and _hw_thread.is_alive()):
+            return
+        _hw_thread = threading.Thread(target=_connect_loop, daemon=True, name="hw-connect")
+        _hw_thread.start()
+
+
+def ensure_hardware(timeout=None):
+    """Czeka na gotowy sprzęt (uruchamia łączenie, jeśli trzeba). False po timeoucie."""
+    if hardware_ready.is_set():
+        return True
+    start_hardware()
+    return hardware_ready.wait(timeout)
+
+
+def _hardware_alive():
+    if pi is None:
+        return True  # sim / sam gpiochip – nie ma demona, który mógłby zniknąć
+    try:
+        pi.get_current_tick()
+        return True
+    except Exception:
+        return False
+
+
+def hardware_lost(error=None):
+    """Wołane po błędzie I/O: jeśli pigpiod nie odpowiada, łączymy od nowa w tle."""
+    if not hardware_ready.is_set() or _hardware_alive():
+        return
+    with _hw_lock:
+        if not hardware_ready.is_set():
+            return
+        hardware_ready.clear()
+        _hw_status["state"] = "lost"
+        _hw_status["last_error"] = str(error) if error is not None else None
+    print("Utracono połączenie z pigpiod:", error)
+    start_hardware()
+
+
+def hardware_status():
+    """Stan połączenia ze sprzętem (ready, state, próby, ostatni błąd)."""
+    status = dict(_hw_status)
+    status["ready"] = hardware_ready.is_set()
+    return status
+
+
+def io_stats():
+    """Wszystkie liczniki I/O naraz (dla Socket.IO "io_stats" i procesu sprzętu)."""
+    return {
+        "scan": scan_stats(),
+        "timing": scan_timing(),
+        "inputs": input_stats(),
+        "outputs": output_stats(),
+        "verify": verify_stats(),
+        "edges": edge_stats(),
+        "trace": trace_report(),
+    }
 
 
 def run(socket, next_step, previoust_step):
-    register_encoder_callbacks(socket)
+    ensure_hardware()
     output_all_one(False)
-    pi.callback(
-        POWER_OFF,
-        pigpio.FALLING_EDGE,
-        lambda g, l, t: power_off_callback(l, socket),
-    )
+    start_edge_inputs(socket)
+    # po restarcie pigpiod callbacki/potok powiadomień trzeba założyć od nowa
+    _on_ready.append(lambda: start_edge_inputs(socket))
+    # wątki pomocnicze startują przed podniesieniem priorytetu – inaczej
+    # dziedziczą SCHED_FIFO i rdzeń skanu
+    input_events.start()
+    output_writer.start()
+    apply_rt_profile("scan")
 
     try:
         while True:
-            poll_165_once(socket, next_step, previoust_step)
-            time.sleep(POLL_INTERVAL_S)
+            scan_loop.begin()
+            try:
+                changed = poll_165_once(socket, next_step, previoust_step)
+            except Exception as e:
+                print("Błąd odczytu wejść:", e)
+                hardware_lost(e)
+                ensure_hardware()
+                scan_loop.sleep(scan_rate.interval())
+                continue
+            watch_keymap()
+            scan_rate.mark(changed)
+            interval = scan_rate.interval()
+            debouncer.set_period(interval)
+            scan_loop.sleep(interval)
     except KeyboardInterrupt:
         pass
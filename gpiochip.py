@@ -0,0 +1,155 @@
+import threading
+from datetime import timedelta
+
+try:
+    import gpiod
+    from gpiod.line import Bias, Direction, Edge, Value
+except ImportError:  # opcjonalne – tylko dla ORGANY_GPIO=gpiochip
+    gpiod = None
+
+from pinbase import INPUT, OUTPUT, PUD_DOWN, PUD_OFF, PUD_UP, RISING_EDGE, EdgeCallbacks
+
+
+class GpioChip(EdgeCallbacks):
+    """
+    Piny przez linuksowe urządzenie znakowe GPIO (/dev/gpiochipN, libgpiod 2.x).
+    Wszystkie linie są brane jednym żądaniem, więc zapis/odczyt kilku linii
+    to jeden ioctl, bez pigpiod po drodze. Interfejs jak w pigpio
+    (read/write/bank/callback), żeby można było podmienić obiekt "pi".
+    Do testów bez RPi wystarczy moduł jądra gpio-sim i ścieżka do jego chipa.
+    """
+
+    def __init__(self, path, lines, consumer="organy"):
+        if gpiod is None:
+            raise RuntimeError("brak modułu gpiod (libgpiod >= 2)")
+        self.path = path
+        self.consumer = consumer
+        # pin -> [tryb, pull, edge]
+        self._lines = {int(pin): [mode, pud, False] for pin, (mode, pud) in lines.items()}
+        self._values = {}  # ostatnio zapisane wyjścia (żeby przeżyły rekonfigurację)
+        self._callbacks = {}  # pin -> [(edge, func), ...]
+        self._debounce = {}  # pin -> µs (debounce linii w jądrze, jak glitch filter pigpio)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._request = gpiod.request_lines(path, consumer=consumer, config=self._config())
+        self._refresh_offsets()
+        self.connected = True
+
+    # --- konfiguracja linii ---
+    def _settings(self, pin):
+        mode, pud, edge = self._lines[pin]
+        if mode == OUTPUT:
+            return gpiod.LineSettings(
+                direction=Direction.OUTPUT,
+                output_value=Value.ACTIVE if self._values.get(pin) else Value.INACTIVE,
+            )
+        bias = {PUD_OFF: Bias.DISABLED, PUD_DOWN: Bias.PULL_DOWN, PUD_UP: Bias.PULL_UP}[pud]
+        return gpiod.LineSettings(
+            direction=Direction.INPUT,
+            bias=bias,
+            edge_detection=Edge.BOTH if edge else Edge.NONE,
+            debounce_period=timedelta(microseconds=self._debounce.get(pin, 0)),
+        )
+
+    def _config(self):
+        return {pin: self._settings(pin) for pin in self._lines}
+
+    def _refresh_offsets(self):
+        self._offsets = list(self._request.offsets)
+        self._outputs = [p for p in self._offsets if self._lines[p][0] == OUTPUT]
+
+    def _apply(self, pin):
+        with self._lock:
+            if pin in self._offsets:
+                self._request.reconfigure_lines(self._config())
+            else:
+                # nowej linii nie da się dołożyć do żądania – bierzemy wszystkie od nowa
+                self._request.release()
+                self._request = gpiod.request_lines(
+                    self.path, consumer=self.consumer, config=self._config()
+                )
+            self._refresh_offsets()
+
+    def set_mode(self, gpio, mode):
+        line = self._lines.setdefault(gpio, [mode, PUD_OFF, False])
+        if line[0] != mode or gpio not in self._offsets:
+            line[0] = mode
+            self._apply(gpio)
+
+    def set_pull_up_down(self, gpio, pud):
+        line = self._lines.setdefault(gpio, [INPUT, pud, False])
+        if line[1] != pud or gpio not in self._offsets:
+            line[1] = pud
+            self._apply(gpio)
+
+    def set_glitch_filter(self, gpio, steady):
+        """Jak pi.set_glitch_filter: zbocza krótsze niż steady µs są pomijane."""
+        if self._debounce.get(gpio, 0) != steady:
+            self._debounce[gpio] = steady
+            self._lines.setdefault(gpio, [INPUT, PUD_OFF, False])
+            self._apply(gpio)
+
+    # --- pojedyncze piny ---
+    def read(self, gpio):
+        return 1 if self._request.get_value(gpio) == Value.ACTIVE else 0
+
+    def write(self, gpio, level):
+        self._values[gpio] = level
+        self._request.set_value(gpio, Value.ACTIVE if level else Value.INACTIVE)
+
+    # --- bank 1: kilka linii jednym ioctl ---
+    def read_bank_1(self):
+        bits = 0
+        for pin, value in zip(self._offsets, self._request.get_values()):
+            if value == Value.ACTIVE and pin < 32:
+                bits |= 1 << pin
+        return bits
+
+    def _set_many(self, bits, level):
+        values = {}
+        value = Value.ACTIVE if level else Value.INACTIVE
+        for pin in self._outputs:
+            if (bits >> pin) & 1:
+                values[pin] = value
+                self._values[pin] = level
+        if values:
+            self._request.set_values(values)
+
+    def set_bank_1(self, bits):
+        self._set_many(bits, 1)
+
+    def clear_bank_1(self, bits):
+        self._set_many(bits, 0)
+
+    # --- zdarzenia (zamiast callbacków pigpio) ---
+    def callback(self, gpio, edge=RISING_EDGE, func=None):
+        handle = self._add_callback(gpio, edge, func)
+        line = self._lines.setdefault(gpio, [INPUT, PUD_OFF, False])
+        if not line[2]:
+            line[2] = True
+            self._apply(gpio)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._event_loop, daemon=True)
+            self._thread.start()
+        return handle
+
+    def _event_loop(self):
+        while self.connected:
+            request = self._request
+            try:
+                if not request.wait_edge_events(0.5):
+                    continue
+                events = request.read_edge_events()
+            except Exception:
+                # żądanie mogło zostać podmienione przez _apply – próbujemy dalej
+                continue
+            for ev in events:
+                level = 1 if ev.event_type == ev.Type.RISING_EDGE else 0
+                tick = (ev.timestamp_ns // 1000) & 0xFFFFFFFF  # jak tick pigpio (µs)
+                self._fire(ev.line_offset, level, tick)
+
+    def stop(self):
+        if not self.connected:
+            return
+        self.connected = False
+        self._request.release()
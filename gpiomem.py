@@ -0,0 +1,99 @@
+import mmap
+import os
+
+from pinbase import PUD_DOWN, PUD_OFF, PUD_UP
+
+# Rejestry GPIO BCM283x/BCM2711 (offsety w bajtach od początku /dev/gpiomem)
+GPFSEL0 = 0x00
+GPSET0 = 0x1C
+GPCLR0 = 0x28
+GPLEV0 = 0x34
+GPPUD = 0x94  # BCM283x: pull-up/down przez sekwencję GPPUD + GPPUDCLK0
+GPPUDCLK0 = 0x98
+GPIO_PUP_PDN_CNTRL_REG0 = 0xE4  # BCM2711 (RPi 4): 2 bity na pin
+
+MAP_SIZE = 4096
+
+
+def _is_bcm2711():
+    try:
+        with open("/proc/device-tree/compatible", "rb") as f:
+            return b"bcm2711" in f.read()
+    except OSError:
+        return False
+
+
+class GpioMem:
+    """
+    Bezpośredni dostęp do rejestrów GPIO przez zmapowane /dev/gpiomem.
+    Ma ten sam interfejs co potrzebne nam wywołania pigpio (read/write/bank/...),
+    ale zapis to jedno przypisanie do pamięci zamiast rundy po sockecie do pigpiod.
+    Zamiast /dev/gpiomem można podać zwykły plik (>= 4 KiB) – do testów bez RPi.
+    """
+
+    def __init__(self, path="/dev/gpiomem", bcm2711=None):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_SYNC)
+        try:
+            self._mem = mmap.mmap(self._fd, MAP_SIZE, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        except Exception:
+            os.close(self._fd)
+            raise
+        self._reg = memoryview(self._mem).cast("I")
+        self.bcm2711 = _is_bcm2711() if bcm2711 is None else bcm2711
+        self.connected = True
+
+    # --- konfiguracja ---
+    def set_mode(self, gpio, mode):
+        idx = GPFSEL0 // 4 + gpio // 10
+        shift = (gpio % 10) * 3
+        self._reg[idx] = (self._reg[idx] & ~(0b111 << shift)) | ((mode & 0b111) << shift)
+
+    def get_mode(self, gpio):
+        return (self._reg[GPFSEL0 // 4 + gpio // 10] >> ((gpio % 10) * 3)) & 0b111
+
+    def set_pull_up_down(self, gpio, pud):
+        if self.bcm2711:
+            # w BCM2711 kodowanie jest odwrotne: 1 = up, 2 = down
+            value = {PUD_OFF: 0, PUD_UP: 1, PUD_DOWN: 2}[pud]
+            idx = GPIO_PUP_PDN_CNTRL_REG0 // 4 + gpio // 16
+            shift = (gpio % 16) * 2
+            self._reg[idx] = (self._reg[idx] & ~(0b11 << shift)) | (value << shift)
+        else:
+            # sekwencja z dokumentacji BCM2835: ustaw, odczekaj 150 cykli, taktuj pin
+            self._reg[GPPUD // 4] = pud
+            for _ in range(150):
+                pass
+            self._reg[GPPUDCLK0 // 4] = 1 << gpio
+            for _ in range(150):
+                pass
+            self._reg[GPPUD // 4] = 0
+            self._reg[GPPUDCLK0 // 4] = 0
+
+    # --- pojedyncze piny ---
+    def read(self, gpio):
+        return (self._reg[GPLEV0 // 4] >> gpio) & 1
+
+    def write(self, gpio, level):
+        if level:
+            self._reg[GPSET0 // 4] = 1 << gpio
+        else:
+            self._reg[GPCLR0 // 4] = 1 << gpio
+
+    # --- bank 1 (GPIO 0-31) ---
+    def read_bank_1(self):
+        return self._reg[GPLEV0 // 4]
+
+    def set_bank_1(self, bits):
+        self._reg[GPSET0 // 4] = bits
+
+    def clear_bank_1(self, bits):
+        self._reg[GPCLR0 // 4] = bits
+
+    def stop(self):
+        if not self.connected:
+            return
+        self.connected = False
+        self._reg.release()
+        self._mem.close()
+        os.close(self._fd)
@@ -0,0 +1,34 @@
+import os
+
+# Skąd proces web bierze funkcje sprzętowe:
+# ORGANY_HW_PROCESS=1 – osobny proces sprzętu (hwproc.py), tu tylko komendy
+#                        przez pamięć współdzieloną; pigpio nie jest importowane
+# inaczej             – gpio w tym samym procesie (jak było)
+HW_PROCESS = os.getenv("ORGANY_HW_PROCESS", "0") == "1"
+
+if HW_PROCESS:
+    from hwproc import client
+
+    apply_state = client.apply_state
+    output_all_one = client.output_all_one
+    reload_keymap = client.reload_keymap
+    disable_keyboard = client.disable_keyboard
+    update_keys = client.update_keys
+    run = client.run
+    hardware_status = client.hardware_status
+    io_stats = client.io_stats
+    rt_report = client.rt_report
+    export_trace_vcd = client.export_trace_vcd
+else:
+    from gpio import (
+        apply_state,
+        output_all_one,
+        reload_keymap,
+        disable_keyboard,
+        update_keys,
+        run,
+        hardware_status,
+        io_stats,
+        export_trace_vcd,
+    )
+    from rtsched import rt_report
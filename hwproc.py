@@ -0,0 +1,556 @@
+import atexit
+import json
+import os
+import struct
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import rtsched
+
+# Sprzęt (595/165/enkoder/kople) w osobnym procesie – ORGANY_HW_PROCESS=1.
+# Proces web i proces sprzętu dzielą jeden blok shared_memory:
+#   - liczniki (u32): pierścienie komend i zdarzeń, seqlock stanu, potwierdzenia
+#   - stan organów spakowany w struct (czyta web bez żadnych blokad)
+#   - pierścień komend web -> sprzęt (sloty po 16 B)
+#   - pierścień zdarzeń sprzęt -> web (emity Socket.IO, next_step/previoust_step)
+#   - statystyki I/O (gpio.io_stats) jako JSON pod własnym seqlockiem, odświeżane co STATS_S
+# Każdy pierścień ma jednego pisarza i jednego czytelnika (proces), więc wystarczą
+# dwa liczniki: pisarz przesuwa head po zapisaniu slotu, czytelnik tail po odczycie.
+# Wątki web piszące komendy serializuje zwykły Lock wewnątrz procesu web.
+
+MAGIC = 0x4F524731  # "ORG1"
+
+# indeksy liczników u32 na początku bloku
+(
+    _MAGIC, _CMD_HEAD, _CMD_TAIL, _EVT_HEAD, _EVT_TAIL, _STATE_SEQ, _ACK_SEQ, _HW_PID, _STATS_SEQ
+) = range(9)
+
+STATE_OFFSET = 64
+# rejestry, crescendo, kople, blokada klawiatury (0/1, 255 = nieznana), mapa wejść ok,
+# sprzęt gotowy, pozycja enkodera, liczba wejść 165, heartbeat (ns), liczba skanów
+_STATE = struct.Struct("<IIBBBBHHQQ")
+INPUT_BYTES = 64  # ostatnia ramka 165 (do 512 wejść)
+
+CMD_OFFSET = 256
+CMD_SLOTS = 256
+CMD_SLOT = 16
+EVT_OFFSET = CMD_OFFSET + CMD_SLOTS * CMD_SLOT
+EVT_SLOTS = 256
+EVT_SLOT = 256
+STATS_OFFSET = EVT_OFFSET + EVT_SLOTS * EVT_SLOT
+STATS_BYTES = 8192  # długość (u32) + JSON
+SIZE = STATS_OFFSET + STATS_BYTES
+_STATS_LEN = struct.Struct("<I")
+
+# komendy: (seq, op) + argumenty
+_CMD = struct.Struct("<IB")
+OP_APPLY_STATE = 1  # maska rejestrów, bity kopli (bit k = kopel 100+k), blokada (-1 = bez zmian)
+OP_OUTPUT_ALL = 2
+OP_UPDATE_KEYS = 3
+OP_DISABLE_KEYBOARD = 4
+OP_RELOAD_KEYMAP = 5
+OP_EXPORT_TRACE = 6  # VCD do ORGANY_TRACE_VCD procesu sprzętu, wynik w statystykach
+_ARGS = {
+    OP_APPLY_STATE: struct.Struct("<IBb"),
+    OP_OUTPUT_ALL: struct.Struct("<B"),
+    OP_UPDATE_KEYS: struct.Struct("<BBB"),
+    OP_DISABLE_KEYBOARD: struct.Struct("<B"),
+    OP_RELOAD_KEYMAP: struct.Struct(""),
+    OP_EXPORT_TRACE: struct.Struct(""),
+}
+_EVT_LEN = struct.Struct("<H")
+
+PUBLISH_S = 0.01  # co ile proces sprzętu odświeża stan bez komend
+STATS_S = 0.5  # co ile odświeża statystyki I/O (JSON jest droższy niż struct stanu)
+IDLE_SLEEP_S = 0.0005  # pusty pierścień – krótki sen zamiast aktywnego czekania
+IDLE_SLEEP_MAX_S = 0.005  # ...podwajany, dopóki pierścień stoi pusty (mniej wybudzeń w spoczynku)
+READ_STATE_TIMEOUT_S = 0.05  # dłużej nieparzysty seq = pisarz zginął w trakcie zapisu
+# jak w gpio: bez echa klawiszy proces web nawet nie wysyła nut
+KEYS_ECHO = os.getenv("ORGANY_KEYS_ECHO", "0") == "1"
+NUM_REGISTERS = 32
+COPELS = (100, 101, 102)
+
+
+class _Ring:
+    """Pierścień SPSC na stałych slotach; head/tail to liczniki u32 bez zawijania do slotów."""
+
+    def __init__(self, buf, ctrl, head, tail, offset, slots, slot_size):
+        self._buf = buf
+        self._ctrl = ctrl
+        self._head = head
+        self._tail = tail
+        self._offset = offset
+        self._slots = slots
+        self._slot_size = slot_size
+
+    def push(self, data):
+        head = self._ctrl[self._head]
+        if (head - self._ctrl[self._tail]) & 0xFFFFFFFF >= self._slots:
+            return False
+        off = self._offset + (head % self._slots) * self._slot_size
+        self._buf[off : off + len(data)] = data
+        # slot zapisany – dopiero teraz publikujemy go czytelnikowi
+        self._ctrl[self._head] = (head + 1) & 0xFFFFFFFF
+        return True
+
+    def pop(self):
+        tail = self._ctrl[self._tail]
+        if tail == self._ctrl[self._head]:
+            return None
+        off = self._offset + (tail % self._slots) * self._slot_size
+        data = bytes(self._buf[off : off + self._slot_size])
+        self._ctrl[self._tail] = (tail + 1) & 0xFFFFFFFF
+        return data
+
+    def depth(self):
+        return (self._ctrl[self._head] - self._ctrl[self._tail]) & 0xFFFFFFFF
+
+
+class _IdleBackoff:
+    """Sen przy pustym pierścieniu: od IDLE_SLEEP_S, podwajany do IDLE_SLEEP_MAX_S, reset po pracy."""
+
+    def __init__(self):
+        self.delay = IDLE_SLEEP_S
+
+    def sleep(self):
+        time.sleep(self.delay)
+        self.delay = min(self.delay * 2, IDLE_SLEEP_MAX_S)
+
+    def reset(self):
+        self.delay = IDLE_SLEEP_S
+
+
+def _views(shm):
+    buf = shm.buf
+    ctrl = buf[:STATE_OFFSET].cast("I")
+    commands = _Ring(buf, ctrl, _CMD_HEAD, _CMD_TAIL, CMD_OFFSET, CMD_SLOTS, CMD_SLOT)
+    events = _Ring(buf, ctrl, _EVT_HEAD, _EVT_TAIL, EVT_OFFSET, EVT_SLOTS, EVT_SLOT)
+    return buf, ctrl, commands, events
+
+
+def _reset_state(buf, ctrl):
+    """Liczniki, pierścienie i stan od zera – przed (ponownym) startem procesu sprzętu."""
+    for index in (
+        _CMD_HEAD, _CMD_TAIL, _EVT_HEAD, _EVT_TAIL, _STATE_SEQ, _ACK_SEQ, _HW_PID, _STATS_SEQ
+    ):
+        ctrl[index] = 0
+    _STATS_LEN.pack_into(buf, STATS_OFFSET, 0)
+    _STATE.pack_into(buf, STATE_OFFSET, 0, 0, 0, 255, 1, 0, 0, 0, 0, 0)
+    start = STATE_OFFSET + _STATE.size
+    buf[start : start + INPUT_BYTES] = bytes(INPUT_BYTES)
+
+
+def read_state(buf, ctrl, timeout=READ_STATE_TIMEOUT_S):
+    """
+    Spójny odczyt stanu (seqlock): powtarzamy, gdy proces sprzętu akurat pisał.
+    None, gdy przez timeout nie udało się trafić w spójny stan (np. proces
+    sprzętu zginął w połowie zapisu i seq został nieparzysty).
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        seq = ctrl[_STATE_SEQ]
+        if not seq & 1:
+            fields = _STATE.unpack_from(buf, STATE_OFFSET)
+            start = STATE_OFFSET + _STATE.size
+            inputs = int.from_bytes(buf[start : start + INPUT_BYTES], "little")
+            if ctrl[_STATE_SEQ] == seq:
+                break
+        if time.monotonic() > deadline:
+            return None
+        time.sleep(0)
+    (
+        registers, crescendo, copels, keyboard, keymap_ok, ready, position, num_inputs, heartbeat, scans
+    ) = fields
+    return {
+        "registers": [n + 1 for n in range(NUM_REGISTERS) if (registers >> n) & 1],
+        "crescendo": [n + 1 for n in range(NUM_REGISTERS) if (crescendo >> n) & 1],
+        "copels": [c for k, c in enumerate(COPELS) if (copels >> k) & 1],
+        "keyboard_disabled": None if keyboard == 255 else bool(keyboard),
+        "keymap_ok": bool(keymap_ok),
+        "ready": bool(ready),
+        "position": position,
+        "inputs": inputs & ((1 << num_inputs) - 1),
+        "heartbeat_ns": heartbeat,
+        "scans": scans,
+    }
+
+
+def read_stats(buf, ctrl, timeout=READ_STATE_TIMEOUT_S):
+    """Statystyki I/O z bloku (seqlock jak read_state); None, gdy brak albo niespójne."""
+    deadline = time.monotonic() + timeout
+    while True:
+        seq = ctrl[_STATS_SEQ]
+        if not seq & 1:
+            (length,) = _STATS_LEN.unpack_from(buf, STATS_OFFSET)
+            start = STATS_OFFSET + _STATS_LEN.size
+            data = bytes(buf[start : start + min(length, STATS_BYTES - _STATS_LEN.size)])
+            if ctrl[_STATS_SEQ] == seq:
+                break
+        if time.monotonic() > deadline:
+            return None
+        time.sleep(0)
+    if not length:
+        return None
+    return json.loads(data)
+
+
+# ======= PROCES SPRZĘTU =======
+class _HardwareSide:
+    def __init__(self, shm, gpio):
+        self.shm = shm
+        self.gpio = gpio
+        self.buf, self.ctrl, self.commands, self.events = _views(shm)
+        self.keyboard = 255
+        self.keymap_ok = 1
+        self.dropped_events = 0
+        self.trace_export = None  # wynik ostatniego OP_EXPORT_TRACE
+        # pierścień zdarzeń ma jednego pisarza, a emitują: kolejka wejść, callbacki/potok
+        # enkodera, timer crescendo i POWER_OFF – serializujemy ich jak _post po stronie web
+        self._event_lock = threading.Lock()
+
+    # --- zdarzenia do procesu web ---
+    def _event(self, message):
+        data = json.dumps(message, ensure_ascii=False).encode()
+        if len(data) > EVT_SLOT - _EVT_LEN.size:
+            print("hwproc: zdarzenie za długie, pomijam:", message.get("e") or message.get("c"))
+            return
+        with self._event_lock:
+            if not self.events.push(_EVT_LEN.pack(len(data)) + data):
+                self.dropped_events += 1
+
+    def emit(self, name, data=None):
+        self._event({"e": name, "d": data})
+
+    def next_step(self):
+        self._event({"c": "next_step"})
+
+    def previoust_step(self):
+        self._event({"c": "previoust_step"})
+
+    # --- stan dla procesu web ---
+    def publish(self):
+        gpio = self.gpio
+        organ = gpio.organ
+        copels = 0
+        for k, c in enumerate(COPELS):
+            if organ.copel(c):
+                copels |= 1 << k
+        num_inputs = min(gpio.NUM_165 * 8, INPUT_BYTES * 8)
+        inputs = (gpio._last_165 or 0) & ((1 << num_inputs) - 1)
+        ctrl = self.ctrl
+        ctrl[_STATE_SEQ] = (ctrl[_STATE_SEQ] + 1) & 0xFFFFFFFF  # nieparzysty – piszemy
+        _STATE.pack_into(
+            self.buf,
+            STATE_OFFSET,
+            organ.registers & 0xFFFFFFFF,
+            organ.crescendo & 0xFFFFFFFF,
+            copels,
+            self.keyboard,
+            self.keymap_ok,
+            1 if gpio.hardware_ready.is_set() else 0,
+            gpio.position,
+            num_inputs,
+            time.monotonic_ns(),
+            gpio.scan_loop.period.count,
+        )
+        start = STATE_OFFSET + _STATE.size
+        self.buf[start : start + INPUT_BYTES] = inputs.to_bytes(INPUT_BYTES, "little")
+        ctrl[_STATE_SEQ] = (ctrl[_STATE_SEQ] + 1) & 0xFFFFFFFF
+
+    def publish_stats(self):
+        stats = self.gpio.io_stats()
+        stats["dropped_events"] = self.dropped_events
+        stats["trace_export"] = self.trace_export
+        # wątek skanu dostaje profil RT tutaj, w procesie sprzętu – raport też idzie przez blok
+        stats["rt"] = rtsched.rt_report()
+        data = json.dumps(stats).encode()
+        if len(data) > STATS_BYTES - _STATS_LEN.size:
+            print("hwproc: statystyki za długie, pomijam")
+            return
+        ctrl = self.ctrl
+        ctrl[_STATS_SEQ] = (ctrl[_STATS_SEQ] + 1) & 0xFFFFFFFF
+        _STATS_LEN.pack_into(self.buf, STATS_OFFSET, len(data))
+        start = STATS_OFFSET + _STATS_LEN.size
+        self.buf[start : start + len(data)] = data
+        ctrl[_STATS_SEQ] = (ctrl[_STATS_SEQ] + 1) & 0xFFFFFFFF
+
+    # --- komendy z procesu web ---
+    def _execute(self, op, args):
+        gpio = self.gpio
+        if op == OP_APPLY_STATE:
+            registers, copels, keyboard = args
+            numbers = [n + 1 for n in range(NUM_REGISTERS) if (registers >> n) & 1]
+            selected = [c for k, c in enumerate(COPELS) if (copels >> k) & 1]
+            gpio.apply_state(numbers, selected, None if keyboard < 0 else bool(keyboard))
+            if keyboard >= 0:
+                self.keyboard = keyboard
+        elif op == OP_OUTPUT_ALL:
+            gpio.output_all_one(bool(args[0]))
+        elif op == OP_UPDATE_KEYS:
+            gpio.update_keys(*args)
+        elif op == OP_DISABLE_KEYBOARD:
+            gpio.disable_keyboard(bool(args[0]))
+            self.keyboard = args[0]
+        elif op == OP_RELOAD_KEYMAP:
+            self.keymap_ok = 1 if gpio.reload_keymap() else 0
+        elif op == OP_EXPORT_TRACE:
+            try:
+                self.trace_export = {"samples": gpio.export_trace_vcd()}
+            except Exception as e:
+                self.trace_export = {"error": str(e)}
+            # wynik idzie blokiem statystyk – publikujemy przed potwierdzeniem
+            self.publish_stats()
+
+    def command_loop(self):
+        last_publish = last_stats = 0.0
+        idle = _IdleBackoff()
+        while True:
+            data = self.commands.pop()
+            if data is None:
+                now = time.monotonic()
+                if now - last_publish >= PUBLISH_S:
+                    self.publish()
+                    last_publish = now
+                if now - last_stats >= STATS_S:
+                    try:
+                        self.publish_stats()
+                    except Exception as e:
+                        print("hwproc: błąd statystyk:", e)
+                    last_stats = now
+                idle.sleep()
+                continue
+            idle.reset()
+            seq, op = _CMD.unpack_from(data)
+            try:
+                self._execute(op, _ARGS[op].unpack_from(data, _CMD.size))
+            except Exception as e:
+                print(f"hwproc: błąd komendy {op}:", e)
+            self.publish()
+            last_publish = time.monotonic()
+            self.ctrl[_ACK_SEQ] = seq
+
+
+def hardware_main(shm_name):
+    """Wejście procesu sprzętu: tu (i tylko tu) importujemy gpio i łączymy się z pigpiod."""
+    import gpio
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    # blok należy do procesu web – nasz resource_tracker nie może go usunąć przy wyjściu
+    resource_tracker.unregister(shm._name, "shared_memory")
+    side = _HardwareSide(shm, gpio)
+    side.publish()
+    threading.Thread(target=side.command_loop, daemon=True, name="hw-commands").start()
+    gpio.run(side, side.next_step, side.previoust_step)
+
+
+# ======= PROCES WEB =======
+class HardwareClient:
+    """
+    Strona web: te same funkcje co gpio (apply_state, output_all_one, ...),
+    ale zamiast pigpio wpisują komendę do pierścienia. run() uruchamia proces
+    sprzętu i przekazuje jego zdarzenia do Socket.IO.
+    """
+
+    def __init__(self):
+        self._shm = None
+        self._proc = None
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self.dropped_commands = 0
+
+    def start(self):
+        with self._lock:
+            if self._shm is None:
+                self._shm = shared_memory.SharedMemory(create=True, size=SIZE)
+                self.buf, self.ctrl, self._commands, self._events = _views(self._shm)
+                self.ctrl[_MAGIC] = MAGIC
+                atexit.register(self.close)
+            if not self.alive():
+                # martwy proces mógł zostawić nieparzysty seq i pół pierścieni
+                _reset_state(self.buf, self.ctrl)
+                self._seq = 0
+                # osobny interpreter: nie dziedziczy wątków Flask ani nie importuje app.py
+                here = os.path.dirname(os.path.abspath(__file__))
+                self._proc = subprocess.Popen(
+                    [sys.executable, os.path.join(here, "hwproc.py"), self._shm.name]
+                )
+                self.ctrl[_HW_PID] = self._proc.pid
+
+    def alive(self):
+        return self._proc is not None and self._proc.poll() is None
+
+    def _post(self, op, *args, timeout=0.1):
+        """Wpisuje komendę; przy pełnym pierścieniu czeka do timeout (0 – odrzuca od razu)."""
+        if self._shm is None:
+            self.start()
+        with self._lock:
+            self._seq = (self._seq + 1) & 0xFFFFFFFF or 1
+            seq = self._seq
+            data = _CMD.pack(seq, op) + _ARGS[op].pack(*args)
+            deadline = time.monotonic() + timeout
+            while not self._commands.push(data):
+                if timeout <= 0:
+                    self.dropped_commands += 1
+                    return None
+                if time.monotonic() > deadline:
+                    self.dropped_commands += 1
+                    print(f"hwproc: pierścień komend pełny, pomijam komendę {op}")
+                    return None
+                time.sleep(IDLE_SLEEP_S)
+        return seq
+
+    def _wait_ack(self, seq, timeout):
+        deadline = time.monotonic() + timeout
+        # porównanie z zawijaniem licznika u32
+        while (self.ctrl[_ACK_SEQ] - seq) & 0x80000000:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(IDLE_SLEEP_S)
+        return True
+
+    # --- API jak w gpio ---
+    def apply_state(self, registers, copels=None, keyboard_disabled=None, timeout=1.0):
+        start = time.perf_counter()
+        numbers = [int(i) for i in registers]
+        selected = numbers if copels is None else [int(i) for i in copels]
+        mask = 0
+        for n in numbers:
+            if 1 <= n <= NUM_REGISTERS:
+                mask |= 1 << (n - 1)
+        copel_bits = 0
+        for k, c in enumerate(COPELS):
+            if c in selected:
+                copel_bits |= 1 << k
+        keyboard = -1 if keyboard_disabled is None else int(bool(keyboard_disabled))
+        seq = self._post(OP_APPLY_STATE, mask, copel_bits, keyboard)
+        if seq is None:
+            return None
+        if not self._wait_ack(seq, timeout):
+            print("apply_state: proces sprzętu nie potwierdził w", timeout, "s")
+            return None
+        return time.perf_counter() - start
+
+    def output_all_one(self, state):
+        self._post(OP_OUTPUT_ALL, int(bool(state)))
+
+    def update_keys(self, status, note, velocity):
+        # woła wątek MIDI przy każdej nucie – nigdy nie czeka na pierścień
+        if not KEYS_ECHO:
+            return
+        self._post(OP_UPDATE_KEYS, status & 0xFF, note & 0xFF, velocity & 0xFF, timeout=0)
+
+    def disable_keyboard(self, state):
+        self._post(OP_DISABLE_KEYBOARD, int(bool(state)))
+
+    def reload_keymap(self, timeout=2.0):
+        seq = self._post(OP_RELOAD_KEYMAP)
+        if seq is None or not self._wait_ack(seq, timeout):
+            return False
+        state = self.state()
+        return state is not None and state["keymap_ok"]
+
+    def export_trace_vcd(self, timeout=5.0):
+        """Jak gpio.export_trace_vcd, ale plik zapisuje proces sprzętu (jego ORGANY_TRACE_VCD)."""
+        seq = self._post(OP_EXPORT_TRACE)
+        if seq is None or not self._wait_ack(seq, timeout):
+            raise RuntimeError("proces sprzętu nie potwierdził zrzutu śladu")
+        result = (read_stats(self.buf, self.ctrl) or {}).get("trace_export") or {}
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        return result.get("samples", 0)
+
+    def state(self):
+        """Stan organów z bloku współdzielonego (bez pytania procesu sprzętu); None, gdy niespójny."""
+        if self._shm is None:
+            self.start()
+        return read_state(self.buf, self.ctrl)
+
+    def hardware_status(self):
+        """Gotowość sprzętu widziana przez proces web (proces żyje i zgłasza połączenie)."""
+        status = self.stats()
+        state = self.state() if status["alive"] else None
+        status["ready"] = state is not None and state["ready"]
+        return status
+
+    def io_stats(self):
+        """Jak gpio.io_stats, z ostatniej publikacji procesu sprzętu, plus liczniki pierścieni."""
+        if self._shm is None:
+            self.start()
+        stats = read_stats(self.buf, self.ctrl) if self.alive() else None
+        stats = stats or {}
+        stats["hwproc"] = self.stats()
+        return stats
+
+    def rt_report(self):
+        """Jak rtsched.rt_report, łącznie z wątkami procesu sprzętu (wątek skanu)."""
+        report = rtsched.rt_report()
+        if self._shm is not None and self.alive():
+            stats = read_stats(self.buf, self.ctrl)
+            if stats:
+                report.update(stats.get("rt", {}))
+        return report
+
+    def stats(self):
+        return {
+            "alive": self.alive(),
+            "pid": self._proc.pid if self._proc is not None else None,
+            "commands_pending": self._commands.depth() if self._shm is not None else 0,
+            "events_pending": self._events.depth() if self._shm is not None else 0,
+            "dropped_commands": self.dropped_commands,
+        }
+
+    def run(self, socket, next_step, previoust_step):
+        """Zamiast gpio.run: start procesu sprzętu i przekazywanie jego zdarzeń."""
+        self.start()
+        idle = _IdleBackoff()
+        while not self._closed:
+            data = self._events.pop()
+            if data is None:
+                if not self.alive() and not self._closed:
+                    print("hwproc: proces sprzętu zakończył się, uruchamiam ponownie")
+                    time.sleep(1.0)
+                    self.start()
+                idle.sleep()
+                continue
+            idle.reset()
+            (length,) = _EVT_LEN.unpack_from(data)
+            message = json.loads(data[_EVT_LEN.size : _EVT_LEN.size + length])
+            try:
+                if "e" in message:
+                    if message["d"] is None:
+                        socket.emit(message["e"])
+                    else:
+                        socket.emit(message["e"], message["d"])
+                elif message["c"] == "next_step":
+                    next_step()
+                elif message["c"] == "previoust_step":
+                    previoust_step()
+            except Exception as e:
+                print("hwproc: błąd obsługi zdarzenia:", e)
+
+    def close(self):
+        self._closed = True
+        if self.alive():
+            self._proc.terminate()
+            try:
+                self._proc.wait(1.0)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+        if self._shm is not None:
+            shm, self._shm = self._shm, None
+            # widoki memoryview trzymają bufor – bez zwolnienia close() rzuca BufferError
+            self.ctrl.release()
+            self.ctrl = self.buf = self._commands = self._events = None
+            shm.close()
+            shm.unlink()
+
+
+client = HardwareClient()
+
+
+if __name__ == "__main__":
+    hardware_main(sys.argv[1])
@@ -0,0 +1,93 @@
+import queue
+import threading
+import time
+from collections import deque
+
+# Kolejka zdarzeń wejściowych: skaner tylko wrzuca zbocza ze znacznikiem czasu,
+# a obsługa (czytanie tracks.json, kople, Socket.IO) dzieje się w osobnym wątku.
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+class InputQueue:
+    """
+    Ograniczona kolejka zdarzeń z jednym wątkiem obsługi.
+    Gdy kolejka jest pełna, nowe zdarzenie jest odrzucane (i liczone) – skaner
+    nigdy nie czeka. Statystyki: głębokość, czas oczekiwania w kolejce
+    i czas od zbocza do końca obsługi (ostatnie `window` zdarzeń).
+    """
+
+    def __init__(self, handler, maxsize=256, window=1024):
+        self._handler = handler
+        self._q = queue.Queue(maxsize)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.posted = 0
+        self.handled = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_depth = 0
+        self._wait = deque(maxlen=window)  # s: zbocze -> start obsługi
+        self._total = deque(maxlen=window)  # s: zbocze -> koniec obsługi
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, daemon=True)
+                self._thread.start()
+
+    def put(self, item, timestamp=None):
+        """Wrzuca zdarzenie; zwraca False, gdy kolejka pełna i zdarzenie odrzucono."""
+        if self._thread is None:
+            self.start()
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        try:
+            self._q.put_nowait((timestamp, item))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.posted += 1
+        depth = self._q.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        return True
+
+    def join(self):
+        """Czeka, aż wszystkie wrzucone zdarzenia zostaną obsłużone."""
+        self._q.join()
+
+    def _loop(self):
+        while True:
+            timestamp, item = self._q.get()
+            started = time.monotonic()
+            try:
+                self._handler(item)
+            except Exception as e:
+                self.errors += 1
+                print("Błąd obsługi zdarzenia wejścia:", e)
+            finally:
+                done = time.monotonic()
+                self._wait.append(started - timestamp)
+                self._total.append(done - timestamp)
+                self.handled += 1
+                self._q.task_done()
+
+    def stats(self):
+        wait = sorted(self._wait)
+        total = sorted(self._total)
+        return {
+            "depth": self._q.qsize(),
+            "max_depth": self.max_depth,
+            "posted": self.posted,
+            "handled": self.handled,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "wait_ms": {p: percentile(wait, p) * 1000 for p in (50, 95, 99)},
+            "latency_ms": {p: percentile(total, p) * 1000 for p in (50, 95, 99)},
+            "latency_max_ms": (total[-1] * 1000) if total else 0.0,
+        }
@@ -0,0 +1,54 @@
+import json
+
+# Mapa wejść 165 -> akcje, wczytywana z pliku JSON, np.:
+# {"inputs": {"0": {"action": "register", "number": 8},
+#             "19": {"action": "tutti"},
+#             "24": {"action": "custom", "name": "moja_akcja"}}}
+
+ACTIONS = {
+    "register": "number",  # przełącz rejestr (1..32) / wyślij numer do UI
+    "copel": "number",  # przełącz kopel 100/101/102
+    "tutti": None,
+    "clear": None,
+    "previous_step": None,
+    "next_step": None,
+    "custom": "name",  # akcja zarejestrowana w kodzie (register_input_action)
+}
+
+
+def parse_keymap(config, num_inputs, num_registers=32, copels=(100, 101, 102)):
+    """
+    Sprawdza mapę i zwraca listę długości num_inputs: (akcja, argument) albo None.
+    Indeks listy = numer wejścia, więc dispatch to jedno odczytanie z listy.
+    Numery rejestrów i kopli są sprawdzane tutaj – błąd ma wyjść przy wczytaniu,
+    a nie przy wciśnięciu (wtedy zostaje poprzednia mapa).
+    """
+    table = [None] * num_inputs
+    for key, entry in config.get("inputs", {}).items():
+        index = int(key)
+        if not 0 <= index < num_inputs:
+            raise ValueError(f"Wejście {index} poza łańcuchem ({num_inputs} wejść)")
+        action = entry.get("action")
+        if action not in ACTIONS:
+            raise ValueError(f"Nieznana akcja {action!r} dla wejścia {index}")
+        arg_name = ACTIONS[action]
+        arg = None
+        if arg_name is not None:
+            if arg_name not in entry:
+                raise ValueError(f"Akcja {action} wejścia {index} wymaga pola {arg_name!r}")
+            arg = entry[arg_name]
+            if arg_name == "number":
+                arg = int(arg)
+                if action == "register" and not 1 <= arg <= num_registers:
+                    raise ValueError(
+                        f"Rejestr {arg} wejścia {index} poza zakresem 1..{num_registers}"
+                    )
+                if action == "copel" and arg not in copels:
+                    raise ValueError(f"Kopel {arg} wejścia {index} – dozwolone {list(copels)}")
+        table[index] = (action, arg)
+    return table
+
+
+def load_keymap(path, num_inputs, num_registers=32, copels=(100, 101, 102)):
+    with open(path, "r", encoding="utf-8") as file:
+        return parse_keymap(json.load(file), num_inputs, num_registers, copels)
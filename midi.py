@@ -2,7 +2,8 @@ import time
 import serial
 import threading
 import mido
-from gpio import disable_keyboard
+from hardware import disable_keyboard, update_keys
+from rtsched import apply_rt_profile
 
 # === KONFIG ===
 SERIAL_DEV = "/dev/serial0"
@@ -152,6 +153,7 @@ class MidiPlayer:
 
     def _play_worker(self):
         """Wątek odtwarzający — nie liczymy w nim pozycji, tylko wysyłamy komunikaty."""
+        apply_rt_profile("midi")
         self._stop_event.clear()
         self._pause_event.clear()
 
@@ -220,6 +222,8 @@ class MidiPlayer:
             raw = msg_to_bytes(msg)
             if raw:
                 self._send_raw(raw)
+                if msg.type in ("note_on", "note_off"):
+                    update_keys(raw[0], raw[1], raw[2])
 
         # zakończenie odtwarzania
         self._close_serial()
@@ -246,7 +250,7 @@ class MidiPlayer:
 
         self._stop_event.clear()
         self._pause_event.clear()
-        self._thread = threading.Thread(target=self._play_worker, daemon=True)
+        self._thread = threading.Thread(target=self._play_worker, daemon=True, name="midi")
         self._thread.start()
         disable_keyboard(True)
 
@@ -0,0 +1,98 @@
+import os
+import struct
+import threading
+
+# Zbocza z potoku powiadomień pigpiod (/dev/pigpioN) zamiast pi.callback.
+# Każdy raport to 12 bajtów: numer, flagi, tick (µs) i poziomy całego banku 1
+# w chwili zmiany – więc stan pinów mamy bez dodatkowych pi.read.
+
+REPORT = struct.Struct("HHII")
+NTFY_FLAGS_WDOG = 1 << 5
+NTFY_FLAGS_ALIVE = 1 << 6
+NTFY_FLAGS_EVENT = 1 << 7
+BATCH_REPORTS = 64  # ile raportów czytamy naraz z potoku
+
+
+class NotifyStream:
+    """
+    Jeden wątek czyta paczki raportów dla wszystkich obserwowanych GPIO
+    i woła handler(zmienione_bity, poziomy, tick) dla każdej zmiany,
+    w kolejności, w jakiej pigpiod je zobaczył.
+    """
+
+    def __init__(self, pi, gpios, handler):
+        self.pi = pi
+        self.mask = 0
+        for gpio in gpios:
+            self.mask |= 1 << gpio
+        self.handler = handler
+        self.reports = 0
+        self.batches = 0
+        self.changes = 0
+        self.lost = 0  # raporty zgubione przez pigpiod (dziura w numeracji)
+        self._handle = pi.notify_open()
+        if self._handle < 0:
+            raise RuntimeError(f"notify_open: {self._handle}")
+        try:
+            self._fd = os.open(f"/dev/pigpio{self._handle}", os.O_RDONLY)
+        except OSError:
+            pi.notify_close(self._handle)
+            raise
+        self._levels = pi.read_bank_1() & self.mask
+        self._seq = None
+        self._running = True
+        pi.notify_begin(self._handle, self.mask)
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        pending = b""
+        while self._running:
+            try:
+                data = os.read(self._fd, REPORT.size * BATCH_REPORTS)
+            except OSError:
+                break
+            if not data:
+                break
+            self.batches += 1
+            data = pending + data
+            usable = len(data) - len(data) % REPORT.size
+            pending = data[usable:]
+            for seq, flags, tick, level in REPORT.iter_unpack(data[:usable]):
+                self._report(seq, flags, tick, level)
+
+    def _report(self, seq, flags, tick, level):
+        self.reports += 1
+        if self._seq is not None:
+            self.lost += (seq - self._seq - 1) & 0xFFFF
+        self._seq = seq
+        if flags & (NTFY_FLAGS_WDOG | NTFY_FLAGS_ALIVE | NTFY_FLAGS_EVENT):
+            return
+        level &= self.mask
+        changed = level ^ self._levels
+        if not changed:
+            return
+        self._levels = level
+        self.changes += 1
+        try:
+            self.handler(changed, level, tick)
+        except Exception as e:
+            print("Błąd obsługi zbocza:", e)
+
+    def stats(self):
+        return {
+            "reports": self.reports,
+            "batches": self.batches,
+            "changes": self.changes,
+            "lost": self.lost,
+        }
+
+    def close(self):
+        if not self._running:
+            return
+        self._running = False
+        try:
+            self.pi.notify_close(self._handle)
+        except Exception:
+            pass
+        os.close(self._fd)
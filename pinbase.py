@@ -0,0 +1,46 @@
+# Wspólne dla backendów pinów (GpioMem, GpioChip, SimPins):
+# wartości jak w pigpio, żeby można było podmienić obiekt "pi",
+# i callbacki zboczy w stylu pi.callback.
+
+INPUT = 0
+OUTPUT = 1
+PUD_OFF = 0
+PUD_DOWN = 1
+PUD_UP = 2
+RISING_EDGE = 0
+FALLING_EDGE = 1
+EITHER_EDGE = 2
+
+
+class Callback:
+    """Uchwyt jak z pi.callback – cancel() wyrejestrowuje funkcję."""
+
+    def __init__(self, pins, gpio, entry):
+        self._pins = pins
+        self.gpio = gpio
+        self._entry = entry
+
+    def cancel(self):
+        self._pins._remove_callback(self.gpio, self._entry)
+
+
+class EdgeCallbacks:
+    """
+    Rejestr callbacków pin -> [(edge, func), ...]; klasa backendu ustawia
+    self._callbacks = {} i woła _fire(pin, poziom, tick) dla każdego zbocza.
+    """
+
+    def _add_callback(self, gpio, edge, func):
+        entry = (edge, func)
+        self._callbacks.setdefault(gpio, []).append(entry)
+        return Callback(self, gpio, entry)
+
+    def _remove_callback(self, gpio, entry):
+        entries = self._callbacks.get(gpio, [])
+        if entry in entries:
+            entries.remove(entry)
+
+    def _fire(self, gpio, level, tick):
+        for edge, func in list(self._callbacks.get(gpio, ())):
+            if edge == EITHER_EDGE or (edge == RISING_EDGE) == bool(level):
+                func(gpio, level, tick)
@@ -0,0 +1,104 @@
+"""
+Odtwarzanie zapisanej sesji konsoli przez skaner 165 i obsługę wejść.
+Nagranie: uruchomić aplikację z ORGANY_CAPTURE_165=plik.o165.
+Odtworzenie idzie na symulowanych pinach (ORGANY_GPIO=sim): ramki są wystawiane
+na symulowany łańcuch 165 i czytane normalnie przez poll_165_once, a akcje
+trafiają do kolejki zdarzeń jak na prawdziwej konsoli.
+Uruchamiać:  python3 replay_165.py plik.o165 [przyspieszenie] [hz]
+(przyspieszenie 0 = tak szybko, jak się da; domyślnie 1 = czas rzeczywisty)
+"""
+
+import os
+import sys
+import time
+
+from capture import read_frames
+from inputqueue import percentile
+
+SETTLE_S = 0.1  # po ostatniej ramce skanujemy jeszcze chwilę, żeby debounce doszedł
+
+
+class ReplaySocket:
+    def __init__(self):
+        self.emits = 0
+
+    def emit(self, *args, **kwargs):
+        self.emits += 1
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    path = sys.argv[1]
+    speed = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    num_bits, frames = read_frames(path)
+    if not frames:
+        print(f"{path}: brak ramek")
+        return
+
+    # konfiguracja musi być gotowa przed importem gpio
+    os.environ.setdefault("ORGANY_GPIO", "sim")
+    os.environ["ORGANY_165_CHIPS"] = str(num_bits // 8)
+    import gpio
+
+    gpio.ensure_hardware()
+    hz = float(sys.argv[3]) if len(sys.argv) > 3 else gpio.SCAN_ACTIVE_HZ
+    period = 1.0 / hz
+    mask = (1 << num_bits) - 1
+    socket = ReplaySocket()
+    steps = [0, 0]
+
+    def next_step():
+        steps[0] += 1
+
+    def previoust_step():
+        steps[1] += 1
+
+    gpio.debouncer.set_period(period)
+    end = frames[-1][0] + SETTLE_S
+    scans = []
+    idx = 0
+    t = 0.0
+    wall_start = time.perf_counter()
+    while t <= end:
+        while idx + 1 < len(frames) and frames[idx + 1][0] <= t:
+            idx += 1
+        frame = frames[idx][1]
+        gpio.pins.set_165_inputs(frame ^ mask if gpio.ACTIVE_LOW_165 else frame)
+        start = time.perf_counter()
+        gpio.poll_165_once(socket, next_step, previoust_step)
+        scans.append(time.perf_counter() - start)
+        t += period
+        if speed > 0:
+            delay = wall_start + t / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    gpio.input_events.join()
+    gpio.output_writer.flush()
+    wall = time.perf_counter() - wall_start
+
+    stats = gpio.input_stats()
+    scans.sort()
+    print(f"\nplik: {path} ({num_bits} bitów, {len(frames)} ramek, {frames[-1][0]:.2f} s)")
+    print(f"skanów: {len(scans)} przy {hz:.0f} Hz w {wall:.2f} s ({len(scans) / wall:.0f} skanów/s)")
+    print(
+        f"zdarzeń: {stats['handled']} ({stats['handled'] / wall:.1f}/s), "
+        f"odrzuconych: {stats['dropped']}, błędów: {stats['errors']}, "
+        f"kroki +{steps[0]}/-{steps[1]}, emit: {socket.emits}"
+    )
+    print(
+        "skan µs: p50={:.0f} p95={:.0f} p99={:.0f} max={:.0f}".format(
+            *(percentile(scans, p) * 1e6 for p in (50, 95, 99, 100))
+        )
+    )
+    print(
+        "zbocze->obsłużone ms: p50={:.3f} p95={:.3f} p99={:.3f} max={:.3f}".format(
+            *(stats["latency_ms"][p] for p in (50, 95, 99)), stats["latency_max_ms"]
+        )
+    )
+    print("rejestry po odtworzeniu:", gpio.organ.active_registers())
+
+
+if __name__ == "__main__":
+    main()
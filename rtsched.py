@@ -0,0 +1,139 @@
+import os
+import threading
+
+# Profil czasu rzeczywistego (opcjonalny): pętla skanu i odtwarzanie MIDI
+# w SCHED_FIFO/SCHED_RR, przypięte do wydzielonych rdzeni (najlepiej isolcpus=
+# w cmdline.txt), a reszta procesu (Flask/Socket.IO) odsunięta z tych rdzeni.
+# Bez uprawnień (CAP_SYS_NICE / root) wątki zostają w SCHED_OTHER – tylko raport.
+
+RT_PROFILE = os.getenv("ORGANY_RT", "0") == "1"
+RT_POLICY = os.getenv("ORGANY_RT_POLICY", "fifo")  # fifo / rr
+# każda rola na swoim rdzeniu, żeby MIDI (wyższy priorytet) nie wywłaszczało skanu
+RT_CPUS = {
+    "scan": os.getenv("ORGANY_RT_CPUS_SCAN", "3"),  # np. "3" albo "2,3"
+    "midi": os.getenv("ORGANY_RT_CPUS_MIDI", "2"),
+}
+RT_PRIORITIES = {
+    "scan": int(os.getenv("ORGANY_RT_PRIO_SCAN", "60")),
+    "midi": int(os.getenv("ORGANY_RT_PRIO_MIDI", "70")),
+}
+
+_POLICY_NAMES = {
+    getattr(os, "SCHED_OTHER", 0): "SCHED_OTHER",
+    getattr(os, "SCHED_FIFO", 1): "SCHED_FIFO",
+    getattr(os, "SCHED_RR", 2): "SCHED_RR",
+    getattr(os, "SCHED_BATCH", 3): "SCHED_BATCH",
+    getattr(os, "SCHED_IDLE", 5): "SCHED_IDLE",
+}
+
+_report = {}  # rola -> co wątek faktycznie dostał
+_lock = threading.Lock()
+
+
+def _parse_cpus(text):
+    cpus = set()
+    for part in text.split(","):
+        part = part.strip()
+        if part:
+            cpus.add(int(part))
+    return cpus
+
+
+def _rt_cpus(role=None):
+    """Rdzenie danej roli albo (bez roli) wszystkie rdzenie RT razem."""
+    if role is not None:
+        return _parse_cpus(RT_CPUS[role])
+    cpus = set()
+    for text in RT_CPUS.values():
+        cpus |= _parse_cpus(text)
+    return cpus
+
+
+def _current_policy():
+    try:
+        policy = os.sched_getscheduler(0)
+        priority = os.sched_getparam(0).sched_priority
+    except (AttributeError, OSError):
+        return "unknown", 0
+    return _POLICY_NAMES.get(policy, str(policy)), priority
+
+
+def _current_cpus():
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return None
+
+
+def reserve_rt_cpus():
+    """
+    Odsuwa bieżący wątek (i wątki, które z niego powstaną) z rdzeni RT.
+    Wołać na starcie, zanim powstaną wątki Flask/USB. Zwraca zbiór rdzeni
+    dla reszty procesu albo None, gdy profil wyłączony lub się nie dało.
+    """
+    if not RT_PROFILE:
+        return None
+    try:
+        others = os.sched_getaffinity(0) - _rt_cpus()
+        if not others:
+            print("Profil RT: brak rdzeni poza", sorted(_rt_cpus()), "– nie odsuwam reszty procesu")
+            return None
+        os.sched_setaffinity(0, others)
+    except (AttributeError, OSError, ValueError) as e:
+        print("Profil RT: nie udało się odsunąć reszty procesu:", e)
+        return None
+    return others
+
+
+def apply_rt_profile(role):
+    """
+    Wołane z wnętrza wątku (sched_* z pid 0 działa na bieżący wątek).
+    Zwraca i zapamiętuje raport: polityka, priorytet, rdzenie, ewentualne błędy.
+    """
+    result = {"thread": threading.current_thread().name, "tid": threading.get_native_id()}
+    errors = []
+    if RT_PROFILE:
+        policy = os.SCHED_RR if RT_POLICY == "rr" else os.SCHED_FIFO
+        try:
+            os.sched_setscheduler(0, policy, os.sched_param(RT_PRIORITIES[role]))
+        except (AttributeError, OSError) as e:
+            errors.append(f"sched_setscheduler: {e}")
+        try:
+            os.sched_setaffinity(0, _rt_cpus(role))
+        except (AttributeError, OSError, ValueError) as e:
+            errors.append(f"sched_setaffinity: {e}")
+
+    result["policy"], result["priority"] = _current_policy()
+    result["cpus"] = _current_cpus()
+    result["errors"] = errors
+    with _lock:
+        _report[role] = result
+    if RT_PROFILE:
+        print(
+            f"Profil RT [{role}]: {result['policy']} prio={result['priority']} cpu={result['cpus']}"
+            + (f" (zostaje domyślnie: {'; '.join(errors)})" if errors else "")
+        )
+    return result
+
+
+def leave_rt_profile():
+    """
+    Dla wątków pomocniczych, które mogą powstać z wątku RT (dziedziczą wtedy jego
+    politykę i rdzeń): wraca do SCHED_OTHER na rdzeniach poza RT.
+    """
+    if not RT_PROFILE:
+        return
+    try:
+        if os.sched_getscheduler(0) != os.SCHED_OTHER:
+            os.sched_setscheduler(0, os.SCHED_OTHER, os.sched_param(0))
+        others = set(range(os.cpu_count() or 1)) - _rt_cpus()
+        if others:
+            os.sched_setaffinity(0, others)
+    except (AttributeError, OSError, ValueError) as e:
+        print("Profil RT: wątek pomocniczy zostaje jak był:", e)
+
+
+def rt_report():
+    """Co dostał każdy wątek, który wołał apply_rt_profile."""
+    with _lock:
+        return {role: dict(r) for role, r in _report.items()}
@@ -0,0 +1,204 @@
+import threading
+import time
+
+# Harmonogram pętli skanującej wejścia 165.
+
+
+class AdaptiveRate:
+    """
+    Częstotliwość skanowania zależna od aktywności.
+    Gdy wejścia stoją – wolne tempo (idle_hz); po każdej zmianie przez
+    hold_s sekund szybkie tempo (active_hz), żeby kolejne naciśnięcia
+    (i puszczenia) były widoczne z małym opóźnieniem.
+    """
+
+    def __init__(self, idle_hz, active_hz, hold_s):
+        self.idle_hz = idle_hz
+        self.active_hz = active_hz
+        self.hold_s = hold_s
+        self._active_until = 0.0
+        self.switches = 0  # ile razy przeszliśmy z idle na active
+
+    def mark(self, changed, now=None):
+        """Wołane po każdym skanie; changed=True, gdy stan wejść się zmienił."""
+        if not changed:
+            return
+        now = time.monotonic() if now is None else now
+        if now >= self._active_until:
+            self.switches += 1
+        self._active_until = now + self.hold_s
+
+    def is_active(self, now=None):
+        now = time.monotonic() if now is None else now
+        return now < self._active_until
+
+    def hz(self, now=None):
+        return self.active_hz if self.is_active(now) else self.idle_hz
+
+    def interval(self, now=None):
+        return 1.0 / self.hz(now)
+
+    def stats(self):
+        active = self.is_active()
+        return {
+            "mode": "active" if active else "idle",
+            "hz": self.active_hz if active else self.idle_hz,
+            "idle_hz": self.idle_hz,
+            "active_hz": self.active_hz,
+            "hold_s": self.hold_s,
+            "switches": self.switches,
+        }
+
+
+# granice koszyków histogramów w µs (ostatni koszyk: powyżej ostatniej granicy)
+HISTOGRAM_BOUNDS_US = (100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000)
+
+
+class Histogram:
+    def __init__(self, bounds_us=HISTOGRAM_BOUNDS_US):
+        self.bounds_us = tuple(bounds_us)
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.bounds_us) + 1)
+        self.count = 0
+        self.total_us = 0.0
+        self.min_us = None
+        self.max_us = 0.0
+
+    def add(self, seconds):
+        us = seconds * 1e6
+        i = 0
+        for bound in self.bounds_us:
+            if us <= bound:
+                break
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total_us += us
+        if self.min_us is None or us < self.min_us:
+            self.min_us = us
+        if us > self.max_us:
+            self.max_us = us
+
+    def stats(self):
+        labels = [f"<={b}us" for b in self.bounds_us] + [f">{self.bounds_us[-1]}us"]
+        return {
+            "count": self.count,
+            "avg_us": self.total_us / self.count if self.count else 0.0,
+            "min_us": self.min_us or 0.0,
+            "max_us": self.max_us,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class DeadlineLoop:
+    """
+    Pętla o stałym okresie liczonym od bezwzględnych terminów (time.monotonic),
+    a nie "skan + sleep(okres)" – czas skanu i obsługi nie przesuwa kolejnych
+    skanów. Gdy skan nie zdąży przed następnym terminem, liczymy przekroczenie
+    i zaczynamy odliczanie od teraz (bez nadrabiania zaległych skanów seriami).
+
+        loop.begin()
+        ... skan ...
+        loop.sleep(okres)
+    """
+
+    def __init__(self, clock=time.monotonic, sleep=time.sleep):
+        self._clock = clock
+        self._sleep = sleep
+        self.period = Histogram()  # odstęp między kolejnymi begin()
+        self.scan = Histogram()  # czas od begin() do sleep()
+        self.overruns = 0
+        self.missed = 0  # ile terminów przepadło przez przekroczenia
+        self._deadline = None
+        self._started = None
+        self._last_begin = None
+
+    def begin(self):
+        now = self._clock()
+        if self._last_begin is not None:
+            self.period.add(now - self._last_begin)
+        self._last_begin = now
+        self._started = now
+        if self._deadline is None:
+            self._deadline = now
+        return now
+
+    def sleep(self, interval):
+        now = self._clock()
+        if self._started is not None:
+            self.scan.add(now - self._started)
+        self._deadline += interval
+        if now >= self._deadline:
+            self.overruns += 1
+            self.missed += int((now - self._deadline) // interval)
+            self._deadline = now
+            return
+        self._sleep(self._deadline - now)
+
+    def reset_stats(self):
+        self.period.reset()
+        self.scan.reset()
+        self.overruns = 0
+        self.missed = 0
+
+    def stats(self):
+        return {
+            "overruns": self.overruns,
+            "missed": self.missed,
+            "period": self.period.stats(),
+            "scan": self.scan.stats(),
+        }
+
+
+class Throttle:
+    """
+    Co najwyżej max_hz wywołań send(wartość) na sekundę.
+    Wartości przychodzące częściej są zlewane – po upływie okresu wysyłana
+    jest tylko najnowsza, więc ostatnia wartość zawsze dochodzi.
+    """
+
+    def __init__(self, max_hz, send):
+        self.period = 1.0 / max_hz
+        self.send = send
+        self.posted = 0
+        self.sent = 0
+        self._lock = threading.Lock()
+        self._last_sent = float("-inf")
+        self._pending = None
+        self._has_pending = False
+        self._timer = None
+
+    def post(self, value):
+        with self._lock:
+            self.posted += 1
+            now = time.monotonic()
+            wait = self._last_sent + self.period - now
+            if wait <= 0 and self._timer is None:
+                self._last_sent = now
+                self.sent += 1
+            else:
+                self._pending = value
+                self._has_pending = True
+                if self._timer is None:
+                    self._timer = threading.Timer(max(wait, 0), self._flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+        self.send(value)
+
+    def _flush(self):
+        with self._lock:
+            self._timer = None
+            if not self._has_pending:
+                return
+            value = self._pending
+            self._pending = None
+            self._has_pending = False
+            self._last_sent = time.monotonic()
+            self.sent += 1
+        self.send(value)
+
+    def stats(self):
+        return {"posted": self.posted, "sent": self.sent, "max_hz": 1.0 / self.period}
@@ -0,0 +1,95 @@
+import threading
+
+from pinbase import INPUT, PUD_UP, RISING_EDGE, EdgeCallbacks
+
+
+class SimPins(EdgeCallbacks):
+    """
+    Symulowane piny (ORGANY_GPIO=sim) – bez RPi i bez pigpiod.
+    Wyjścia tylko zapamiętują stan, wejścia z pull-upem czytają 1.
+    Po attach_165 symuluje też łańcuch 74HC165: stan wejść ustawia się
+    przez set_165_inputs, a read_165_* czyta go normalnie przez PL/CP/Q7.
+    """
+
+    def __init__(self):
+        self._modes = {}
+        self._pud = {}
+        self._levels = 0  # bit = GPIO
+        self._callbacks = {}  # pin -> [(edge, func), ...]
+        self._lock = threading.Lock()
+        self._165 = None  # (pl, cp, q7)
+        self._165_inputs = 0
+        self._165_shift = 0
+        self.connected = True
+
+    # --- konfiguracja ---
+    def set_mode(self, gpio, mode):
+        self._modes[gpio] = mode
+
+    def get_mode(self, gpio):
+        return self._modes.get(gpio, INPUT)
+
+    def set_pull_up_down(self, gpio, pud):
+        self._pud[gpio] = pud
+        if self.get_mode(gpio) == INPUT:
+            self._set_level(gpio, 1 if pud == PUD_UP else 0)
+
+    # --- łańcuch 165 ---
+    def attach_165(self, pl, cp, q7):
+        self._165 = (pl, cp, q7)
+
+    def set_165_inputs(self, levels):
+        """Surowe poziomy wejść łańcucha: bit i = i-ty bit wysuwany na Q7."""
+        self._165_inputs = levels
+
+    # --- piny ---
+    def _set_level(self, gpio, level):
+        with self._lock:
+            old = (self._levels >> gpio) & 1
+            if level:
+                self._levels |= 1 << gpio
+            else:
+                self._levels &= ~(1 << gpio)
+        if old != level:
+            self._edge(gpio, level)
+
+    def _edge(self, gpio, level):
+        if self._165 is not None:
+            pl, cp, q7 = self._165
+            if gpio == pl and not level:
+                self._165_shift = self._165_inputs
+            elif gpio == cp and level:
+                self._165_shift >>= 1
+        self._fire(gpio, level, 0)
+
+    def read(self, gpio):
+        if self._165 is not None and gpio == self._165[2]:
+            return self._165_shift & 1
+        return (self._levels >> gpio) & 1
+
+    def write(self, gpio, level):
+        self._set_level(gpio, 1 if level else 0)
+
+    def read_bank_1(self):
+        return self._levels & 0xFFFFFFFF
+
+    def set_bank_1(self, bits):
+        for gpio in range(32):
+            if (bits >> gpio) & 1:
+                self._set_level(gpio, 1)
+
+    def clear_bank_1(self, bits):
+        for gpio in range(32):
+            if (bits >> gpio) & 1:
+                self._set_level(gpio, 0)
+
+    def inject(self, gpio, level):
+        """Zmiana poziomu wejścia "z zewnątrz" (enkoder, POWER_OFF) – odpala callbacki."""
+        self._set_level(gpio, 1 if level else 0)
+
+    # --- zdarzenia ---
+    def callback(self, gpio, edge=RISING_EDGE, func=None):
+        return self._add_callback(gpio, edge, func)
+
+    def stop(self):
+        self.connected = False
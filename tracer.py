@@ -0,0 +1,152 @@
+import functools
+import threading
+import time
+from array import array
+
+# Śledzenie operacji na pinach: każde zbocze trafia z czasem monotonicznym
+# do prealokowanego bufora pierścieniowego, a całość można zrzucić do pliku VCD
+# (GTKWave, PulseView, sigrok). Do tego liczniki i czasy wywołań per operacja.
+
+
+class Tracer:
+    def __init__(self, size=65536, names=None):
+        self.size = size
+        self.names = dict(names or {})  # pin -> nazwa w VCD
+        self.enabled = True
+        self.levels = 0  # bieżący stan wszystkich śledzonych pinów (bit = GPIO)
+        self._t = array("q", bytes(8 * size))
+        self._v = array("Q", bytes(8 * size))
+        self._n = 0  # ile zapisano od startu (indeks w pierścieniu = _n % size)
+        self._lock = threading.Lock()
+        self.ops = {}  # nazwa -> [wywołania, suma_ns, max_ns]
+
+    # --- zbocza ---
+    def change(self, set_bits, clear_bits):
+        """Zapisuje próbkę, jeśli po ustawieniu/skasowaniu bitów stan się zmienił."""
+        with self._lock:
+            levels = (self.levels & ~clear_bits) | set_bits
+            if levels == self.levels:
+                return
+            self.levels = levels
+            i = self._n % self.size
+            self._t[i] = time.monotonic_ns()
+            self._v[i] = levels
+            self._n += 1
+
+    def set_level(self, gpio, level):
+        if level:
+            self.change(1 << gpio, 0)
+        else:
+            self.change(0, 1 << gpio)
+
+    def samples(self):
+        """Zapisane próbki (czas_ns, stan) od najstarszej."""
+        with self._lock:
+            n = self._n
+            count = min(n, self.size)
+            start = n - count
+            return [(self._t[i % self.size], self._v[i % self.size]) for i in range(start, n)]
+
+    def clear(self):
+        with self._lock:
+            self._n = 0
+            self.ops.clear()
+
+    # --- czasy operacji ---
+    def timed(self, name, func):
+        stat = self.ops.setdefault(name, [0, 0, 0])
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                took = time.perf_counter_ns() - start
+                stat[0] += 1
+                stat[1] += took
+                if took > stat[2]:
+                    stat[2] = took
+
+        return wrapper
+
+    def report(self):
+        out = {}
+        for name, (count, total, worst) in self.ops.items():
+            out[name] = {
+                "calls": count,
+                "total_ms": total / 1e6,
+                "avg_us": total / count / 1e3 if count else 0.0,
+                "max_us": worst / 1e3,
+            }
+        out["transitions"] = {"recorded": self._n, "kept": min(self._n, self.size)}
+        return out
+
+    # --- eksport ---
+    def export_vcd(self, path):
+        samples = self.samples()
+        pins = sorted(self.names)
+        ids = {pin: chr(33 + i) for i, pin in enumerate(pins)}
+        t0 = samples[0][0] if samples else 0
+        with open(path, "w", encoding="ascii") as f:
+            f.write(f"$date {time.strftime('%Y-%m-%d %H:%M:%S')} $end\n")
+            f.write("$timescale 1ns $end\n")
+            f.write("$scope module organy $end\n")
+            for pin in pins:
+                f.write(f"$var wire 1 {ids[pin]} {self.names[pin]} $end\n")
+            f.write("$upscope $end\n$enddefinitions $end\n")
+            prev = None
+            for t, levels in samples:
+                changed = pins if prev is None else [
+                    p for p in pins if ((levels ^ prev) >> p) & 1
+                ]
+                if changed:
+                    f.write(f"#{t - t0}\n")
+                    for pin in changed:
+                        f.write(f"{(levels >> pin) & 1}{ids[pin]}\n")
+                prev = levels
+        return len(samples)
+
+
+class TracedPins:
+    """Owija obiekt "pins" (pigpio/GpioMem/GpioChip) i zapisuje każde zbocze w Tracer."""
+
+    def __init__(self, pins, tracer):
+        self._pins = pins
+        self._tracer = tracer
+        self._watched = 0
+        for pin in tracer.names:
+            self._watched |= 1 << pin
+
+    def write(self, gpio, level):
+        self._pins.write(gpio, level)
+        if self._tracer.enabled:
+            self._tracer.set_level(gpio, level)
+
+    def read(self, gpio):
+        level = self._pins.read(gpio)
+        if self._tracer.enabled:
+            self._tracer.set_level(gpio, level)
+        return level
+
+    def set_bank_1(self, bits):
+        self._pins.set_bank_1(bits)
+        if self._tracer.enabled:
+            self._tracer.change(bits, 0)
+
+    def clear_bank_1(self, bits):
+        self._pins.clear_bank_1(bits)
+        if self._tracer.enabled:
+            self._tracer.change(0, bits)
+
+    def read_bank_1(self):
+        bits = self._pins.read_bank_1()
+        if self._tracer.enabled:
+            self._tracer.change(bits & self._watched, self._watched)
+        return bits
+
+    def __getattr__(self, name):
+        # reszta (set_mode, callback, stop, ...) bez śledzenia
+        return getattr(self._pins, name)
@@ -0,0 +1,60 @@
+"""
+Sprawdzenie łańcucha 74HC595 bez multimetru.
+Wymaga wpięcia Q7' ostatniego układu do RPi (patrz VERIFY_MODE w gpio.py).
+
+  python3 verify_595.py            – wzory testowe + odczyt zwrotny
+  python3 verify_595.py speed      – szukanie najwyższego zegara SPI (Q7' na MISO)
+                                     albo najkrótszego kroku waveformu (OUTPUT_MODE=wave)
+"""
+
+import random
+import sys
+
+import gpio
+
+
+def check_patterns(nbits):
+    patterns = [0, (1 << nbits) - 1]
+    patterns += [1 << i for i in range(nbits)]  # "spacer" pojedynczej jedynki
+    patterns += [random.getrandbits(nbits) for _ in range(50)]
+    bad = 0
+    with gpio.chain_lock:
+        for frame in patterns:
+            gpio.readback(frame, nbits)  # wpychamy wzór do rejestru
+            if not gpio.verify_frame(frame, nbits):
+                bad += 1
+    print(f"wzorów: {len(patterns)}, błędnych: {bad}")
+    if gpio.verify_counters["last_error"]:
+        print("ostatni błąd:", gpio.verify_counters["last_error"])
+    return bad
+
+
+def main():
+    if gpio.VERIFY_MODE == "off":
+        print("Ustaw ORGANY_VERIFY=gpio|165|spi")
+        return 1
+    if not gpio.ensure_hardware(10):
+        print("Sprzęt niegotowy:", gpio.hardware_status()["last_error"])
+        return 1
+    nbits = gpio.chain.nbits if gpio.chain is not None else gpio.NUM_REGISTERS
+    if len(sys.argv) > 1 and sys.argv[1] == "speed":
+        if isinstance(gpio._tx, gpio.WaveTransmitter):
+            best, results = gpio.find_min_wave_step()
+            for step, errors in results.items():
+                print(f"{step:>4} µs  błędów: {errors}")
+            print("najkrótszy bezbłędny krok (ORGANY_WAVE_STEP_US):", best)
+            return 0
+        best, results = gpio.find_max_spi_baud()
+        for baud, errors in results.items():
+            print(f"{baud:>10} Hz  błędów: {errors}")
+        print("najwyższy bezbłędny zegar:", best)
+        return 0
+    bad = check_patterns(nbits)
+    # przywróć to, co powinno być na wyjściach
+    gpio.shift_out_from_cords(force=True)
+    gpio.output_writer.flush()
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())